@@ -58,6 +58,8 @@ def ensure_requirements(root: Path) -> None:
     add = []
     if not re.search(r"(?im)^requests\b", txt):
         add.append("requests>=2.31.0")
+    if not re.search(r"(?im)^httpx\b", txt):
+        add.append("httpx[http2]>=0.27.0")
     if add:
         txt = txt.rstrip() + "\n" + "\n".join(add) + "\n"
         write_text(req, txt)
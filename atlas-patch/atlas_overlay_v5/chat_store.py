@@ -1,9 +1,10 @@
 from __future__ import annotations
-import json, os
-from typing import Any, Dict, List
+import asyncio, json, os, uuid
+from typing import Any, Dict, List, Optional
 from fastapi import FastAPI, APIRouter
 from fastapi.responses import JSONResponse
-from .common import connect, now_iso
+from starlette.concurrency import run_in_threadpool
+from .common import connect, env, now_iso
 
 def _init_db() -> None:
     con = connect()
@@ -21,6 +22,27 @@ def _init_db() -> None:
     finally:
         con.close()
 
+# Cap on provider calls in flight; waiting chats queue on the event loop, not in the threadpool.
+_MAX_CONCURRENCY = int(env("ATLAS_LLM_MAX_CONCURRENCY", "64"))
+_slots: Optional[asyncio.Semaphore] = None
+
+def _concurrency_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(_MAX_CONCURRENCY)
+    return _slots
+
+def _insert_rows(rows: List[tuple]) -> None:
+    # Short write transaction; never held across the provider call.
+    if not rows:
+        return
+    con = connect()
+    try:
+        con.executemany("INSERT INTO chat_history (id, role, content, meta_json, created_at) VALUES (?,?,?,?,?)", rows)
+        con.commit()
+    finally:
+        con.close()
+
 def _mvp_reply(user_text: str) -> Dict[str, str]:
     return {"role":"assistant","content":"OK. Stored. Use Engines/Foundry/Web Hub to produce outputs."}
 
@@ -34,52 +56,43 @@ def install_chat_store(app: FastAPI) -> None:
         if not isinstance(msgs, list):
             return JSONResponse({"ok": False, "error": "messages must be list"}, status_code=422)
 
-        con = connect()
-        try:
-            last_user = ""
-            for m in msgs[-20:]:
-                role = str(m.get("role") or "user")
-                content = str(m.get("content") or "")
-                if not content:
-                    continue
-                if role in ("user","owner"):
-                    last_user = content
-                mid = __import__("uuid").uuid4().hex
-                con.execute(
-                    "INSERT INTO chat_history (id, role, content, meta_json, created_at) VALUES (?,?,?,?,?)",
-                    (mid, role, content, json.dumps({}), now_iso())
-                )
-
-            # Optional external LLM (safe-off by default)
-            # If EXTAPI_KEY is present, we keep it minimal and resilient.
-            reply = _mvp_reply(last_user)
-            ext_key = os.environ.get("EXTAPI_KEY","").strip()
-            ext_model = os.environ.get("EXTERNAL_LLM_MODEL","gpt-4o-mini").strip() or "gpt-4o-mini"
-            if ext_key:
-                try:
-                    import requests
-                    # OpenAI-compatible endpoint can be set later; keep default.
-                    base = os.environ.get("EXTERNAL_LLM_BASE_URL","https://api.openai.com").strip() or "https://api.openai.com"
-                    url = base.rstrip("/") + "/v1/chat/completions"
-                    body = {"model": ext_model, "messages": [{"role":"user","content": last_user}], "temperature": float(payload.get("temperature", 0.2))}
-                    rr = requests.post(url, headers={"Authorization": f"Bearer {ext_key}", "Content-Type":"application/json"}, json=body, timeout=30)
-                    if rr.status_code == 200:
-                        data = rr.json()
-                        txt = (data.get("choices") or [{}])[0].get("message", {}).get("content") or ""
-                        if txt.strip():
-                            reply = {"role":"assistant","content": txt.strip()[:8000]}
-                except Exception:
-                    pass
+        last_user = ""
+        rows = []
+        for m in msgs[-20:]:
+            role = str(m.get("role") or "user")
+            content = str(m.get("content") or "")
+            if not content:
+                continue
+            if role in ("user","owner"):
+                last_user = content
+            rows.append((uuid.uuid4().hex, role, content, json.dumps({}), now_iso()))
+        await run_in_threadpool(_insert_rows, rows)
 
-            rid = __import__("uuid").uuid4().hex
-            con.execute(
-                "INSERT INTO chat_history (id, role, content, meta_json, created_at) VALUES (?,?,?,?,?)",
-                (rid, "assistant", reply["content"], json.dumps({"mvp": not bool(ext_key)}), now_iso())
-            )
-            con.commit()
-        finally:
-            con.close()
+        # Optional external LLM (safe-off by default)
+        # If EXTAPI_KEY is present, we keep it minimal and resilient.
+        reply = _mvp_reply(last_user)
+        ext_key = os.environ.get("EXTAPI_KEY","").strip()
+        ext_model = os.environ.get("EXTERNAL_LLM_MODEL","gpt-4o-mini").strip() or "gpt-4o-mini"
+        if ext_key:
+            try:
+                from .http_client import apost_json
+                # OpenAI-compatible endpoint can be set later; keep default.
+                base = os.environ.get("EXTERNAL_LLM_BASE_URL","https://api.openai.com").strip() or "https://api.openai.com"
+                url = base.rstrip("/") + "/v1/chat/completions"
+                body = {"model": ext_model, "messages": [{"role":"user","content": last_user}], "temperature": float(payload.get("temperature", 0.2))}
+                async with _concurrency_slots():
+                    rr = await apost_json(url, {"Authorization": f"Bearer {ext_key}", "Content-Type":"application/json"}, body, timeout=30)
+                if rr.status_code == 200:
+                    data = rr.json()
+                    txt = (data.get("choices") or [{}])[0].get("message", {}).get("content") or ""
+                    if txt.strip():
+                        reply = {"role":"assistant","content": txt.strip()[:8000]}
+            except Exception:
+                pass
 
+        await run_in_threadpool(_insert_rows, [
+            (uuid.uuid4().hex, "assistant", reply["content"], json.dumps({"mvp": not bool(ext_key)}), now_iso())
+        ])
         return {"ok": True, "reply": reply}
 
     @r.get("/history")
@@ -102,3 +115,11 @@ def install_chat_store(app: FastAPI) -> None:
         return {"ok": True, "items": list(reversed(items))}
 
     app.include_router(r)
+
+    async def _close_http_client() -> None:
+        import sys
+        mod = sys.modules.get(__package__ + ".http_client")
+        if mod is not None:
+            await mod.aclose_client()
+
+    app.add_event_handler("shutdown", _close_http_client)
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import asyncio, random, threading, time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from .common import env
+
+# Overlay copy of the host's keep-alive provider client (the overlay stays self-contained).
+# One process-wide pooled client; HTTP/2 when the h2 package is installed.
+POOL_SIZE = int(env("ATLAS_HTTP_POOL_SIZE", "20"))
+KEEPALIVE = int(env("ATLAS_HTTP_KEEPALIVE", "10"))
+CONNECT_TIMEOUT_S = float(env("ATLAS_HTTP_CONNECT_TIMEOUT_S", "5"))
+READ_TIMEOUT_S = float(env("ATLAS_HTTP_READ_TIMEOUT_S", "60"))
+RETRIES = int(env("ATLAS_HTTP_RETRIES", "2"))
+BACKOFF_BASE_S = float(env("ATLAS_HTTP_BACKOFF_BASE_S", "0.25"))
+BACKOFF_MAX_S = float(env("ATLAS_HTTP_BACKOFF_MAX_S", "8"))
+BREAKER_THRESHOLD = int(env("ATLAS_HTTP_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN_S = float(env("ATLAS_HTTP_BREAKER_COOLDOWN_S", "30"))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    # closed -> open after `threshold` consecutive failures; after `cooldown_s` one probe
+    # request is let through (half-open) and its outcome closes or re-opens the circuit.
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown_s: float = BREAKER_COOLDOWN_S) -> None:
+        self.threshold = threshold
+        self.cooldown_s = cooldown_s
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown_s else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self) -> None:
+        # A call that ended without success()/failure() (cancelled, unexpected error). If it was
+        # the half-open probe, re-open for another cooldown instead of leaving the probe taken.
+        with self._lock:
+            if self._probing:
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+_lock = threading.Lock()
+_async_client: Optional[httpx.AsyncClient] = None
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def client_options() -> dict:
+    return {
+        "http2": _http2_available(),
+        "limits": httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=KEEPALIVE),
+        "timeout": httpx.Timeout(READ_TIMEOUT_S, connect=CONNECT_TIMEOUT_S),
+    }
+
+def get_async_client() -> httpx.AsyncClient:
+    # Bound to the serving event loop, so create it from within that loop.
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(**client_options())
+    return _async_client
+
+async def aclose_client() -> None:
+    global _async_client
+    client, _async_client = _async_client, None
+    if client is not None:
+        await client.aclose()
+
+def breaker_for(url: str) -> CircuitBreaker:
+    host = urlsplit(url).netloc
+    with _lock:
+        return _breakers.setdefault(host, CircuitBreaker())
+
+def backoff_s(attempt: int, retry_after: Optional[str] = None) -> float:
+    # Full jitter exponential backoff; a numeric Retry-After (429/503) takes precedence.
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX_S)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** attempt)))
+
+async def apost_json(url: str, headers: dict, payload: dict, timeout: Optional[float] = None) -> httpx.Response:
+    # Retries 429/5xx and transport errors. Raises CircuitOpenError when the host's breaker is
+    # open and httpx.TransportError if every attempt failed; otherwise returns the last response.
+    breaker = breaker_for(url)
+    if not breaker.allow():
+        raise CircuitOpenError(f"circuit open for {urlsplit(url).netloc}")
+    client = get_async_client()
+    kwargs = {"timeout": timeout} if timeout is not None else {}
+    try:
+        for attempt in range(RETRIES + 1):
+            last = attempt == RETRIES
+            try:
+                r = await client.post(url, headers=headers, json=payload, **kwargs)
+            except httpx.TransportError:
+                if last:
+                    breaker.failure()
+                    raise
+                await asyncio.sleep(backoff_s(attempt))
+                continue
+            if r.status_code in RETRY_STATUS and not last:
+                await asyncio.sleep(backoff_s(attempt, r.headers.get("retry-after")))
+                continue
+            # 429 means the provider is up (just throttling us), so only 5xx trips the breaker.
+            if r.status_code >= 500:
+                breaker.failure()
+            else:
+                breaker.success()
+            return r
+    except BaseException:
+        breaker.release()
+        raise
+    raise AssertionError("unreachable")
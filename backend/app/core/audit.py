@@ -1,11 +1,206 @@
+import asyncio
+import atexit
 import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
 from datetime import datetime, timezone
-from .db import db
+from .db import db, DB_PATH
+
+# Audit events are queued in memory and written by one background thread, batched into a
+# single transaction every FLUSH_MS. Rows go to monthly partition tables (audit_pYYYYMM);
+# partitions older than RETENTION_MONTHS are moved to an archive database.
+FLUSH_MS = int(os.getenv("ATLAS_AUDIT_FLUSH_MS", "200"))
+BATCH_MAX = int(os.getenv("ATLAS_AUDIT_BATCH_MAX", "1000"))
+QUEUE_MAX = int(os.getenv("ATLAS_AUDIT_QUEUE_MAX", "10000"))
+OVERFLOW = os.getenv("ATLAS_AUDIT_OVERFLOW", "block").strip().lower()  # block | drop | sample
+SAMPLE_N = int(os.getenv("ATLAS_AUDIT_SAMPLE_N", "10"))
+RETENTION_MONTHS = int(os.getenv("ATLAS_AUDIT_RETENTION_MONTHS", "12"))
+ARCHIVE_PATH = os.getenv("ATLAS_AUDIT_ARCHIVE_PATH", os.path.splitext(DB_PATH)[0] + ".audit-archive.db")
+
+log = logging.getLogger("atlas.audit")
+
+def partition_name(ts: str) -> str:
+    # ts is ISO-8601 UTC ("2025-12-30T20:08:23..."), so the month is its first 7 chars.
+    return f"audit_p{ts[:4]}{ts[5:7]}"
+
+class AuditSink:
+    _STOP = object()
+
+    def __init__(self, flush_ms: int = FLUSH_MS, batch_max: int = BATCH_MAX, queue_max: int = QUEUE_MAX,
+                 overflow: str = OVERFLOW, sample_n: int = SAMPLE_N) -> None:
+        if overflow not in ("block", "drop", "sample"):
+            raise ValueError("ATLAS_AUDIT_OVERFLOW must be block, drop or sample")
+        self.flush_s = flush_ms / 1000
+        self.batch_max = batch_max
+        self.overflow = overflow
+        self.sample_n = max(1, sample_n)
+        self.stats = {"queued": 0, "written": 0, "dropped": 0, "sampled_out": 0}
+        self._q: queue.Queue = queue.Queue(maxsize=queue_max)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._partitions: set[str] = set()
+        self._seq = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+                self._thread.start()
+
+    def submit(self, ts: str, event: str, meta_json: str, block: bool = True) -> bool:
+        # block=False: under the block policy, return False instead of waiting on a full queue.
+        self.start()
+        row = (ts, event, meta_json)
+        if self.overflow == "block":
+            try:
+                self._q.put(row, block=block)
+            except queue.Full:
+                return False
+        else:
+            if self.overflow == "sample" and self._q.qsize() >= self._q.maxsize // 2:
+                # Under pressure keep 1 of every sample_n events.
+                self._seq += 1
+                if self._seq % self.sample_n:
+                    self.stats["sampled_out"] += 1
+                    return False
+            try:
+                self._q.put_nowait(row)
+            except queue.Full:
+                self.stats["dropped"] += 1
+                return False
+        self.stats["queued"] += 1
+        return True
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            item = self._q.get()
+            if item is self._STOP:
+                self._q.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_s
+            while len(batch) < self.batch_max:
+                try:
+                    nxt = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if nxt is self._STOP:
+                    self._q.task_done()
+                    stop = True
+                    break
+                batch.append(nxt)
+            new_parts = False
+            try:
+                new_parts = self._write(batch)
+            except sqlite3.Error:
+                self.stats["dropped"] += len(batch)
+            for _ in batch:
+                self._q.task_done()
+            if new_parts:
+                # The batch is already committed; a failed rotation is retried with the next new partition.
+                try:
+                    self.rotate()
+                except sqlite3.Error:
+                    log.exception("audit partition rotation failed")
+
+    def _write(self, batch: list[tuple[str, str, str]]) -> bool:
+        # Returns True when the batch created a new monthly partition (time to rotate).
+        by_part: dict[str, list[tuple[str, str, str]]] = {}
+        for row in batch:
+            by_part.setdefault(partition_name(row[0]), []).append(row)
+        new_parts = [p for p in by_part if p not in self._partitions]
+        with db() as conn:
+            for part in new_parts:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {part}(id INTEGER PRIMARY KEY, ts TEXT NOT NULL, event TEXT NOT NULL, meta_json TEXT NOT NULL)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{part}_event_ts ON {part}(event, ts)")
+            for part, rows in by_part.items():
+                conn.executemany(f"INSERT INTO {part}(ts,event,meta_json) VALUES (?,?,?)", rows)
+        self._partitions.update(new_parts)
+        self.stats["written"] += len(batch)
+        return bool(new_parts)
+
+    def rotate(self, now: datetime | None = None) -> list[str]:
+        # Moves partitions older than RETENTION_MONTHS into the archive database.
+        if RETENTION_MONTHS <= 0:
+            return []
+        now = now or datetime.now(timezone.utc)
+        month = now.year * 12 + now.month - 1 - RETENTION_MONTHS
+        cutoff = f"audit_p{month // 12:04d}{month % 12 + 1:02d}"
+        moved = []
+        with db() as conn:
+            old = [r[0] for r in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name GLOB 'audit_p[0-9]*' AND name < ?", (cutoff,))]
+            if not old:
+                return []
+            conn.commit()
+            conn.execute("ATTACH DATABASE ? AS archive", (ARCHIVE_PATH,))
+            try:
+                for part in old:
+                    conn.execute(f"CREATE TABLE IF NOT EXISTS archive.{part}(id INTEGER PRIMARY KEY, ts TEXT NOT NULL, event TEXT NOT NULL, meta_json TEXT NOT NULL)")
+                    conn.execute(f"INSERT INTO archive.{part}(ts,event,meta_json) SELECT ts,event,meta_json FROM main.{part}")
+                    conn.execute(f"DROP TABLE main.{part}")
+                    moved.append(part)
+                conn.commit()
+            finally:
+                try:
+                    if conn.in_transaction:
+                        conn.rollback()  # a failed move leaves the archive locked, and DETACH refuses
+                    conn.execute("DETACH DATABASE archive")
+                except sqlite3.Error:
+                    # Don't mask the error that got us here.
+                    log.warning("could not detach the audit archive", exc_info=True)
+        self._partitions.difference_update(moved)
+        return moved
+
+    def flush(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._q.join()
+
+    def close(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._q.put(self._STOP)
+            thread.join()
+
+sink = AuditSink()
+atexit.register(sink.close)
 
 def audit(event: str, meta: dict) -> None:
     ts = datetime.now(timezone.utc).isoformat()
+    meta_json = json.dumps(meta, ensure_ascii=False)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is None or sink.overflow != "block":
+        sink.submit(ts, event, meta_json)
+    elif not sink.submit(ts, event, meta_json, block=False):
+        # Called from a coroutine with the queue full: wait for room on an executor thread,
+        # never on the event loop.
+        loop.run_in_executor(None, sink.submit, ts, event, meta_json)
+
+def recent_audit(limit: int = 100, event: str | None = None) -> list[dict]:
+    # Newest first; reads partitions from the current month backwards until `limit` rows.
+    sink.flush()
+    items: list[dict] = []
     with db() as conn:
-        conn.execute(
-            "INSERT INTO audit(ts,event,meta_json) VALUES (?,?,?)",
-            (ts, event, json.dumps(meta, ensure_ascii=False)),
-        )
+        parts = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name GLOB 'audit_p[0-9]*' ORDER BY name DESC")]
+        for part in parts:
+            sql = f"SELECT ts,event,meta_json FROM {part}"
+            params: list = []
+            if event:
+                sql += " WHERE event = ?"
+                params.append(event)
+            sql += " ORDER BY ts DESC LIMIT ?"
+            params.append(limit - len(items))
+            items.extend({"ts": ts, "event": ev, "meta": json.loads(m)} for ts, ev, m in conn.execute(sql, params))
+            if len(items) >= limit:
+                break
+    return items
@@ -0,0 +1,19 @@
+import json
+from datetime import datetime, timezone
+from .db import db
+
+def save_message(role: str, content: str, meta: dict) -> int:
+    with db() as conn:
+        cur = conn.execute(
+            "INSERT INTO chat_messages(role,content,meta_json,created_at) VALUES (?,?,?,?)",
+            (role, content, json.dumps(meta, ensure_ascii=False), datetime.now(timezone.utc).isoformat()),
+        )
+        return cur.lastrowid
+
+def recent_messages(limit: int = 50) -> list[dict]:
+    # Oldest first, i.e. in conversation order.
+    with db() as conn:
+        rows = conn.execute(
+            "SELECT id,role,content,meta_json,created_at FROM chat_messages ORDER BY id DESC LIMIT ?", (limit,)
+        ).fetchall()
+    return [{"id": i, "role": r, "content": c, "meta": json.loads(m), "created_at": ts} for i, r, c, m, ts in reversed(rows)]
@@ -1,35 +1,151 @@
 import os
 import sqlite3
+import threading
 from contextlib import contextmanager
+from datetime import datetime, timezone
 from typing import Iterator
 
 DB_PATH = os.getenv("ATLAS_DB_PATH", os.path.join(os.path.dirname(__file__), "..", "data", "app.db"))
+BUSY_TIMEOUT_MS = int(os.getenv("ATLAS_DB_BUSY_TIMEOUT_MS", "5000"))
 
-def ensure_db() -> None:
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("""
+# Append-only: (version, statements). Applied once per database, recorded in schema_migrations.
+MIGRATIONS: list[tuple[int, list[str]]] = [
+    (1, [
+        """
         CREATE TABLE IF NOT EXISTS settings(
             k TEXT PRIMARY KEY,
             v TEXT NOT NULL,
             updated_at TEXT NOT NULL
         )
-        """)
-        conn.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS audit(
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             ts TEXT NOT NULL,
             event TEXT NOT NULL,
             meta_json TEXT NOT NULL
         )
-        """)
+        """,
+    ]),
+    (2, [
+        # Bumped by triggers on every settings write; workers poll it to invalidate their caches.
+        "CREATE TABLE IF NOT EXISTS settings_version(id INTEGER PRIMARY KEY CHECK (id = 1), v INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO settings_version(id, v) VALUES (1, 0)",
+        "CREATE TRIGGER IF NOT EXISTS trg_settings_ins AFTER INSERT ON settings BEGIN UPDATE settings_version SET v = v + 1 WHERE id = 1; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_settings_upd AFTER UPDATE ON settings BEGIN UPDATE settings_version SET v = v + 1 WHERE id = 1; END",
+        "CREATE TRIGGER IF NOT EXISTS trg_settings_del AFTER DELETE ON settings BEGIN UPDATE settings_version SET v = v + 1 WHERE id = 1; END",
+    ]),
+    (3, [
+        """
+        CREATE TABLE IF NOT EXISTS chat_messages(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            meta_json TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_chat_messages_created ON chat_messages(created_at)",
+    ]),
+    (4, [
+        """
+        CREATE TABLE IF NOT EXISTS llm_cache(
+            key TEXT PRIMARY KEY,
+            response_json TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)",
+        "CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache(created_at)",
+    ]),
+]
+
+_init_lock = threading.Lock()
+_initialized = False
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def migrate(conn: sqlite3.Connection) -> list[int]:
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_migrations(version INTEGER PRIMARY KEY, applied_at TEXT NOT NULL)")
+    conn.commit()
+    applied = []
+    for version, statements in MIGRATIONS:
+        if conn.execute("SELECT 1 FROM schema_migrations WHERE version = ?", (version,)).fetchone():
+            continue
+        # BEGIN IMMEDIATE serializes concurrent workers; re-check once we hold the write lock.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not conn.execute("SELECT 1 FROM schema_migrations WHERE version = ?", (version,)).fetchone():
+                for stmt in statements:
+                    conn.execute(stmt)
+                conn.execute(
+                    "INSERT INTO schema_migrations(version, applied_at) VALUES (?,?)",
+                    (version, datetime.now(timezone.utc).isoformat()),
+                )
+                applied.append(version)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return applied
+
+def ensure_db() -> None:
+    # Runs the schema migrations at most once per process.
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+        conn = _connect()
+        try:
+            conn.isolation_level = None
+            migrate(conn)
+        finally:
+            conn.close()
+        _initialized = True
+
+class _ThreadPool:
+    # One long-lived connection per thread; connections of exited threads are reaped.
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._conns: dict[int, sqlite3.Connection] = {}
+
+    def acquire(self) -> sqlite3.Connection:
+        ident = threading.get_ident()
+        conn = self._conns.get(ident)
+        if conn is None:
+            conn = _connect()
+            with self._lock:
+                alive = {t.ident for t in threading.enumerate()}
+                for dead in [i for i in self._conns if i not in alive]:
+                    self._conns.pop(dead).close()
+                self._conns[ident] = conn
+        return conn
+
+    def close_all(self) -> None:
+        with self._lock:
+            for conn in self._conns.values():
+                conn.close()
+            self._conns.clear()
+
+pool = _ThreadPool()
 
 @contextmanager
 def db() -> Iterator[sqlite3.Connection]:
     ensure_db()
-    conn = sqlite3.connect(DB_PATH)
+    conn = pool.acquire()
     try:
         yield conn
         conn.commit()
-    finally:
-        conn.close()
+    except BaseException:
+        conn.rollback()
+        raise
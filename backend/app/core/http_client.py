@@ -0,0 +1,191 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+
+import httpx
+
+# Process-wide keep-alive client for outbound provider calls (one TCP/TLS handshake per
+# pooled connection, not per request). HTTP/2 is used when the h2 package is installed.
+POOL_SIZE = int(os.getenv("ATLAS_HTTP_POOL_SIZE", "20"))
+KEEPALIVE = int(os.getenv("ATLAS_HTTP_KEEPALIVE", "10"))
+CONNECT_TIMEOUT_S = float(os.getenv("ATLAS_HTTP_CONNECT_TIMEOUT_S", "5"))
+READ_TIMEOUT_S = float(os.getenv("ATLAS_HTTP_READ_TIMEOUT_S", "60"))
+RETRIES = int(os.getenv("ATLAS_HTTP_RETRIES", "2"))
+BACKOFF_BASE_S = float(os.getenv("ATLAS_HTTP_BACKOFF_BASE_S", "0.25"))
+BACKOFF_MAX_S = float(os.getenv("ATLAS_HTTP_BACKOFF_MAX_S", "8"))
+BREAKER_THRESHOLD = int(os.getenv("ATLAS_HTTP_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN_S = float(os.getenv("ATLAS_HTTP_BREAKER_COOLDOWN_S", "30"))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    # closed -> open after `threshold` consecutive failures; after `cooldown_s` one probe
+    # request is let through (half-open) and its outcome closes or re-opens the circuit.
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown_s: float = BREAKER_COOLDOWN_S) -> None:
+        self.threshold = threshold
+        self.cooldown_s = cooldown_s
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown_s else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self) -> None:
+        # A call that ended without success()/failure() (cancelled, unexpected error). If it was
+        # the half-open probe, re-open for another cooldown instead of leaving the probe taken.
+        with self._lock:
+            if self._probing:
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+_lock = threading.Lock()
+_async_client: httpx.AsyncClient | None = None
+_breakers: dict[str, CircuitBreaker] = {}
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def client_options() -> dict:
+    return {
+        "http2": _http2_available(),
+        "limits": httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=KEEPALIVE),
+        "timeout": httpx.Timeout(READ_TIMEOUT_S, connect=CONNECT_TIMEOUT_S),
+    }
+
+def get_async_client() -> httpx.AsyncClient:
+    # Bound to the serving event loop, so create it from within that loop.
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(**client_options())
+    return _async_client
+
+async def aclose_client() -> None:
+    global _async_client
+    client, _async_client = _async_client, None
+    if client is not None:
+        await client.aclose()
+
+def breaker_for(url: str) -> CircuitBreaker:
+    host = urlsplit(url).netloc
+    with _lock:
+        return _breakers.setdefault(host, CircuitBreaker())
+
+def backoff_s(attempt: int, retry_after: str | None = None) -> float:
+    # Full jitter exponential backoff; a numeric Retry-After (429/503) takes precedence.
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX_S)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** attempt)))
+
+async def apost_json(url: str, headers: dict, payload: dict, timeout: float | None = None) -> httpx.Response:
+    # Retries 429/5xx and transport errors. Raises CircuitOpenError when the host's breaker is
+    # open and httpx.TransportError if every attempt failed; otherwise returns the last response.
+    breaker = breaker_for(url)
+    if not breaker.allow():
+        raise CircuitOpenError(f"circuit open for {urlsplit(url).netloc}")
+    client = get_async_client()
+    kwargs = {"timeout": timeout} if timeout is not None else {}
+    try:
+        for attempt in range(RETRIES + 1):
+            last = attempt == RETRIES
+            try:
+                r = await client.post(url, headers=headers, json=payload, **kwargs)
+            except httpx.TransportError:
+                if last:
+                    breaker.failure()
+                    raise
+                await asyncio.sleep(backoff_s(attempt))
+                continue
+            if r.status_code in RETRY_STATUS and not last:
+                await asyncio.sleep(backoff_s(attempt, r.headers.get("retry-after")))
+                continue
+            # 429 means the provider is up (just throttling us), so only 5xx trips the breaker.
+            if r.status_code >= 500:
+                breaker.failure()
+            else:
+                breaker.success()
+            return r
+    except BaseException:
+        breaker.release()
+        raise
+    raise AssertionError("unreachable")
+
+@asynccontextmanager
+async def stream_post_json(url: str, headers: dict, payload: dict) -> AsyncIterator[httpx.Response]:
+    # Async streaming POST. Retries (same policy as apost_json) only happen before the response
+    # headers arrive; once the body is being relayed a failure is the caller's to handle.
+    breaker = breaker_for(url)
+    if not breaker.allow():
+        raise CircuitOpenError(f"circuit open for {urlsplit(url).netloc}")
+    client = get_async_client()
+    try:
+        for attempt in range(RETRIES + 1):
+            last = attempt == RETRIES
+            request = client.build_request("POST", url, headers=headers, json=payload)
+            try:
+                r = await client.send(request, stream=True)
+            except httpx.TransportError:
+                if last:
+                    breaker.failure()
+                    raise
+                await asyncio.sleep(backoff_s(attempt))
+                continue
+            if r.status_code in RETRY_STATUS and not last:
+                await r.aclose()
+                await asyncio.sleep(backoff_s(attempt, r.headers.get("retry-after")))
+                continue
+            if r.status_code >= 500:
+                breaker.failure()
+            else:
+                breaker.success()
+            break
+    except BaseException:
+        # e.g. the SSE client disconnected (CancelledError) while waiting for headers
+        breaker.release()
+        raise
+    try:
+        yield r
+    finally:
+        await r.aclose()
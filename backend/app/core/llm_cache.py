@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from .db import db
+
+# Response cache for (near-)deterministic completions: an in-process LRU in front of the
+# llm_cache table. Only requests with temperature <= MAX_TEMPERATURE are cached.
+MAX_TEMPERATURE = float(os.getenv("ATLAS_LLM_CACHE_MAX_TEMPERATURE", "0"))
+TTL_S = float(os.getenv("ATLAS_LLM_CACHE_TTL_S", "86400"))
+MEMORY_ENTRIES = int(os.getenv("ATLAS_LLM_CACHE_MEMORY_ENTRIES", "256"))
+MAX_BYTES = int(os.getenv("ATLAS_LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Memory hits are written back to accessed_at in batches, at least this often and always
+# before an eviction pass, so entries served from memory don't look cold to the size cap.
+TOUCH_FLUSH_S = float(os.getenv("ATLAS_LLM_CACHE_TOUCH_FLUSH_S", "30"))
+
+BYPASS_HEADER = "x-llm-cache"  # "bypass": skip the lookup (the fresh response is still stored)
+
+def cache_key(base_url: str, model: str, messages: list[dict], temperature: float) -> str:
+    canonical = json.dumps(
+        {"base_url": base_url.rstrip("/"), "model": model, "messages": messages, "temperature": float(temperature)},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    def __init__(self, max_temperature: float = MAX_TEMPERATURE, ttl_s: float = TTL_S,
+                 memory_entries: int = MEMORY_ENTRIES, max_bytes: int = MAX_BYTES) -> None:
+        self.max_temperature = max_temperature
+        self.ttl_s = ttl_s
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "memory_hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0}
+        self._lru: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._touched: dict[str, float] = {}
+        self._flushed_at = time.time()
+        self._lock = threading.Lock()
+
+    def applies(self, temperature: float) -> bool:
+        return self.ttl_s > 0 and self.max_bytes > 0 and temperature <= self.max_temperature
+
+    def _remember(self, key: str, expires_at: float, value: dict) -> None:
+        with self._lock:
+            self._lru[key] = (expires_at, value)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.memory_entries:
+                self._lru.popitem(last=False)
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            hit = self._lru.get(key)
+            if hit is not None:
+                if hit[0] > now:
+                    self._lru.move_to_end(key)
+                    self._touched[key] = now
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    if now - self._flushed_at < TOUCH_FLUSH_S:
+                        return hit[1]
+                else:
+                    del self._lru[key]
+                    hit = None
+        if hit is not None:
+            with db() as conn:
+                self._flush_touches(conn)
+            return hit[1]
+        with db() as conn:
+            row = conn.execute("SELECT response_json, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] + self.ttl_s > now:
+                conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            else:
+                row = None
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+        value = json.loads(row[0])
+        self._remember(key, row[1] + self.ttl_s, value)
+        self.stats["hits"] += 1
+        return value
+
+    def put(self, key: str, value: dict) -> None:
+        now = time.time()
+        blob = json.dumps(value, ensure_ascii=False)
+        if len(blob) > self.max_bytes:
+            return
+        with db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache(key,response_json,size,created_at,accessed_at) VALUES (?,?,?,?,?)",
+                (key, blob, len(blob), now, now),
+            )
+            self.stats["evictions"] += self._evict(conn, now)
+        self._remember(key, now + self.ttl_s, value)
+        self.stats["stores"] += 1
+
+    def _flush_touches(self, conn) -> None:
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._flushed_at = time.time()
+        if touched:
+            conn.executemany("UPDATE llm_cache SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+                             [(ts, key) for key, ts in touched.items()])
+
+    def _evict(self, conn, now: float) -> int:
+        # Expired rows first, then least recently used until the table fits in max_bytes.
+        self._flush_touches(conn)
+        evicted = conn.execute("DELETE FROM llm_cache WHERE created_at <= ?", (now - self.ttl_s,)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return evicted
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+        with self._lock:
+            for (key,) in victims:
+                self._lru.pop(key, None)
+        return evicted + len(victims)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+            self._touched.clear()
+        with db() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+cache = ResponseCache()
@@ -1,6 +1,11 @@
+import asyncio
+import json
 import os
-import requests
+from typing import AsyncIterator
+from starlette.concurrency import run_in_threadpool
 from .settings import get_setting
+from .llm_cache import cache, cache_key
+from .llm_scheduler import scheduler, estimate_tokens, RateLimitTimeout
 
 def _env_or_setting(env_key: str, setting_key: str) -> str | None:
     v = os.getenv(env_key)
@@ -9,19 +14,43 @@ def _env_or_setting(env_key: str, setting_key: str) -> str | None:
     s = get_setting(setting_key)
     return s.strip() if s else None
 
-def chat(messages: list[dict], temperature: float = 0.2) -> dict:
+def _provider() -> tuple[str, str, dict, str] | None:
+    # (base url, completions url, headers, model), or None when no API key is configured.
     base_url = _env_or_setting("EXTERNAL_LLM_BASE_URL", "llm.base_url") or "https://api.openai.com"
     api_key  = _env_or_setting("EXTERNAL_LLM_API_KEY", "llm.api_key")
     model    = _env_or_setting("EXTERNAL_LLM_MODEL", "llm.model") or "gpt-4o-mini"
-
     if not api_key:
-        return {"ok": False, "error": "Missing EXTERNAL_LLM_API_KEY (or settings llm.api_key)."}
-
+        return None
     url = base_url.rstrip("/") + "/v1/chat/completions"
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    payload = {"model": model, "messages": messages, "temperature": temperature}
+    return base_url, url, headers, model
+
+MISSING_KEY = "Missing EXTERNAL_LLM_API_KEY (or settings llm.api_key)."
+
+def _cache_lookup(base_url: str, model: str, messages: list[dict], temperature: float,
+                  bypass_cache: bool) -> tuple[str | None, dict | None, str]:
+    # -> (key to store under or None, cached response or None, cache status for the caller)
+    if not cache.applies(temperature):
+        return None, None, "off"
+    key = cache_key(base_url, model, messages, temperature)
+    if bypass_cache:
+        cache.stats["bypassed"] += 1
+        return key, None, "bypass"
+    hit = cache.get(key)
+    return key, hit, "hit" if hit is not None else "miss"
 
-    r = requests.post(url, headers=headers, json=payload, timeout=60)
+RATE_LIMITED = "LLM rate limit: request waited too long in queue."
+# Cap on upstream calls in flight (streams hold a slot until they end).
+MAX_CONCURRENCY = int(os.getenv("ATLAS_LLM_MAX_CONCURRENCY", "64"))
+_slots: asyncio.Semaphore | None = None
+
+def _concurrency_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _slots
+
+def _result(r, model: str, key: str | None, status: str) -> dict:
     if r.status_code >= 400:
         return {"ok": False, "error": f"LLM HTTP {r.status_code}", "details": r.text[:2000]}
     data = r.json()
@@ -29,4 +58,111 @@ def chat(messages: list[dict], temperature: float = 0.2) -> dict:
         content = data["choices"][0]["message"]["content"]
     except Exception:
         content = None
-    return {"ok": True, "model": model, "content": content, "raw": data}
+    return {"ok": True, "model": model, "content": content, "raw": data, "cache": status}
+
+async def _acomplete(url: str, headers: dict, payload: dict, key: str | None, status: str) -> dict:
+    # One upstream (non-streaming) completion; stores cacheable results.
+    # deferred: keeps the HTTP client import off cold start
+    from .http_client import apost_json, CircuitOpenError
+    import httpx
+    try:
+        async with _concurrency_slots():
+            r = await apost_json(url, headers, payload)
+    except CircuitOpenError as e:
+        return {"ok": False, "error": "LLM provider unavailable (circuit open).", "details": str(e)}
+    except httpx.HTTPError as e:
+        return {"ok": False, "error": "LLM request failed.", "details": str(e)[:2000]}
+    result = _result(r, payload["model"], key, status)
+    if key is not None and result.get("content") is not None:
+        await run_in_threadpool(cache.put, key, {"content": result["content"], "raw": result["raw"]})
+    return result
+
+def _prepare(messages: list[dict], temperature: float, bypass_cache: bool) -> dict:
+    # Provider config plus cache lookup (both may touch SQLite, so callers run this in the threadpool).
+    provider = _provider()
+    if provider is None:
+        return {"error": {"ok": False, "error": MISSING_KEY}}
+    base_url, url, headers, model = provider
+    key, hit, status = _cache_lookup(base_url, model, messages, temperature, bypass_cache)
+    return {
+        "url": url, "headers": headers, "model": model, "key": key, "hit": hit, "status": status,
+        # Bypassing callers want a fresh answer, so they don't join an in-flight call.
+        "inflight_key": cache_key(base_url, model, messages, temperature) + (":bypass" if bypass_cache else ""),
+    }
+
+def _cached(prep: dict) -> dict:
+    hit = prep["hit"]
+    return {"ok": True, "model": prep["model"], "content": hit["content"], "raw": hit.get("raw"), "cache": prep["status"]}
+
+async def achat(messages: list[dict], temperature: float = 0.2, bypass_cache: bool = False,
+                priority: str = "interactive") -> dict:
+    # No threadpool slot is held while waiting on the provider or the rate limiter.
+    prep = await run_in_threadpool(_prepare, messages, temperature, bypass_cache)
+    if "error" in prep:
+        return prep["error"]
+    if prep["hit"] is not None:
+        return _cached(prep)
+    payload = {"model": prep["model"], "messages": messages, "temperature": temperature}
+    try:
+        return await scheduler.run_async(prep["inflight_key"], prep["model"], messages, priority,
+                                         lambda: _acomplete(prep["url"], prep["headers"], payload, prep["key"], prep["status"]))
+    except RateLimitTimeout as e:
+        return {"ok": False, "error": RATE_LIMITED, "details": str(e)}
+
+async def chat_stream(messages: list[dict], temperature: float = 0.2, bypass_cache: bool = False,
+                      priority: str = "interactive") -> AsyncIterator[dict]:
+    # Yields {"type": "delta", "content": ...} per provider token chunk, then exactly one
+    # terminal {"type": "done", ...} or {"type": "error", ...} event. A cache hit is
+    # replayed as a single delta.
+    prep = await run_in_threadpool(_prepare, messages, temperature, bypass_cache)
+    if "error" in prep:
+        yield {"type": "error", **prep["error"]}
+        return
+    url, headers, model, key, status = prep["url"], prep["headers"], prep["model"], prep["key"], prep["status"]
+    if prep["hit"] is not None:
+        if prep["hit"]["content"]:
+            yield {"type": "delta", "content": prep["hit"]["content"]}
+        yield {"type": "done", "ok": True, "model": model, "finish_reason": "stop", "cache": status}
+        return
+    payload = {"model": model, "messages": messages, "temperature": temperature, "stream": True}
+    # Streams are paced but not coalesced (each client gets its own delta stream).
+    try:
+        await scheduler.acquire_async(model, estimate_tokens(messages), priority)
+    except RateLimitTimeout as e:
+        yield {"type": "error", "ok": False, "error": RATE_LIMITED, "details": str(e)}
+        return
+
+    from .http_client import stream_post_json, CircuitOpenError
+    import httpx
+    try:
+        async with _concurrency_slots(), stream_post_json(url, headers, payload) as r:
+            if r.status_code >= 400:
+                body = (await r.aread()).decode("utf-8", "replace")
+                yield {"type": "error", "ok": False, "error": f"LLM HTTP {r.status_code}", "details": body[:2000]}
+                return
+            finish_reason = None
+            parts: list[str] = []
+            async for line in r.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    choice = (json.loads(data).get("choices") or [{}])[0]
+                except (ValueError, AttributeError):
+                    continue
+                finish_reason = choice.get("finish_reason") or finish_reason
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield {"type": "delta", "content": delta}
+    except CircuitOpenError as e:
+        yield {"type": "error", "ok": False, "error": "LLM provider unavailable (circuit open).", "details": str(e)}
+        return
+    except httpx.HTTPError as e:
+        yield {"type": "error", "ok": False, "error": "LLM request failed.", "details": str(e)[:2000]}
+        return
+    if key is not None and finish_reason == "stop":
+        await run_in_threadpool(cache.put, key, {"content": "".join(parts), "raw": None})
+    yield {"type": "done", "ok": True, "model": model, "finish_reason": finish_reason, "cache": status}
@@ -0,0 +1,180 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Awaitable, Callable
+
+# Sits between llm_gateway and the provider: identical in-flight requests share one upstream
+# call, and upstream calls are paced by per-model token buckets (requests/min, tokens/min).
+# Callers over quota wait in a per-model priority queue instead of eating provider 429s.
+DEFAULT_RPM = float(os.getenv("ATLAS_LLM_RPM", "0"))  # 0 = unlimited
+DEFAULT_TPM = float(os.getenv("ATLAS_LLM_TPM", "0"))
+# Per-model overrides, e.g. {"gpt-4o-mini": {"rpm": 500, "tpm": 200000}}
+MODEL_LIMITS: dict = json.loads(os.getenv("ATLAS_LLM_LIMITS", "") or "{}")
+QUEUE_TIMEOUT_S = float(os.getenv("ATLAS_LLM_QUEUE_TIMEOUT_S", "120"))
+COMPLETION_TOKENS_EST = int(os.getenv("ATLAS_LLM_COMPLETION_TOKENS_EST", "256"))
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+POLL_S = 0.05  # queued callers re-check admission at least this often
+
+class RateLimitTimeout(Exception):
+    pass
+
+def estimate_tokens(messages: list[dict]) -> int:
+    # ~4 chars per token plus per-message overhead and an allowance for the completion.
+    chars = sum(len(str(m.get("content") or "")) for m in messages)
+    return chars // 4 + 4 * len(messages) + COMPLETION_TOKENS_EST
+
+class TokenBucket:
+    # Refills continuously at rate_per_min; bursts up to one minute's worth. rate 0 = unlimited.
+    def __init__(self, rate_per_min: float) -> None:
+        self.capacity = float(rate_per_min)
+        self.tokens = self.capacity
+        self.rate_s = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_s)
+        self.updated = now
+
+    def wait_s(self, amount: float, now: float) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        need = min(amount, self.capacity) - self.tokens
+        return need / self.rate_s if need > 0 else 0.0
+
+    def take(self, amount: float) -> None:
+        if self.capacity > 0:
+            # May go negative (oversized requests, settle() corrections); that is repaid by refill.
+            self.tokens -= amount
+
+class _AsyncCall:
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.waiters = 0
+
+class Scheduler:
+    def __init__(self, queue_timeout_s: float = QUEUE_TIMEOUT_S) -> None:
+        self.queue_timeout_s = queue_timeout_s
+        self.stats = {"upstream": 0, "coalesced": 0, "queued": 0, "wait_ms": 0.0, "timeouts": 0}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._queues: dict[str, list[tuple[int, int]]] = {}
+        self._buckets: dict[str, tuple[TokenBucket, TokenBucket]] = {}
+        self._ainflight: dict[str, _AsyncCall] = {}
+
+    def _buckets_for(self, model: str) -> tuple[TokenBucket, TokenBucket]:
+        b = self._buckets.get(model)
+        if b is None:
+            limits = MODEL_LIMITS.get(model) or {}
+            b = (TokenBucket(limits.get("rpm", DEFAULT_RPM)), TokenBucket(limits.get("tpm", DEFAULT_TPM)))
+            self._buckets[model] = b
+        return b
+
+    def _enqueue(self, model: str, priority: str) -> tuple[int, int]:
+        entry = (PRIORITIES.get(priority, 0), next(self._seq))
+        heapq.heappush(self._queues.setdefault(model, []), entry)
+        return entry
+
+    def _dequeue(self, model: str, entry: tuple[int, int]) -> None:
+        queue = self._queues[model]
+        if entry in queue:
+            queue.remove(entry)
+            heapq.heapify(queue)
+
+    def _try_take(self, model: str, entry: tuple[int, int], tokens: int, deadline: float) -> float | None:
+        # Called with _lock held. Returns 0 once admitted, else how long to wait
+        # (None = not at the head of the queue yet). Raises RateLimitTimeout past the deadline.
+        now = time.monotonic()
+        queue = self._queues[model]
+        wait = None
+        if queue[0] == entry:
+            rpm, tpm = self._buckets_for(model)
+            wait = max(rpm.wait_s(1, now), tpm.wait_s(tokens, now))
+            if wait <= 0:
+                heapq.heappop(queue)
+                rpm.take(1)
+                tpm.take(tokens)
+                return 0.0
+        remaining = deadline - now
+        if remaining <= 0:
+            self.stats["timeouts"] += 1
+            raise RateLimitTimeout(f"rate limit queue timeout for {model}")
+        return min(wait, remaining) if wait is not None else None
+
+    def _record_wait(self, t0: float) -> None:
+        waited = time.monotonic() - t0
+        if waited > 0.001:
+            self.stats["queued"] += 1
+            self.stats["wait_ms"] += round(waited * 1000, 1)
+
+    async def acquire_async(self, model: str, tokens: int, priority: str = "interactive",
+                            timeout_s: float | None = None) -> None:
+        # Waits until this request is first in its model's queue and both buckets can pay for it.
+        t0 = time.monotonic()
+        deadline = t0 + (self.queue_timeout_s if timeout_s is None else timeout_s)
+        with self._lock:
+            entry = self._enqueue(model, priority)
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_take(model, entry, tokens, deadline)
+                if wait == 0:
+                    break
+                await asyncio.sleep(min(wait, POLL_S) if wait is not None else POLL_S)
+        except BaseException:
+            with self._lock:
+                self._dequeue(model, entry)
+            raise
+        self._record_wait(t0)
+
+    def settle(self, model: str, estimated: int, actual: int | None) -> None:
+        # Corrects the tokens/min bucket once the provider reports real usage.
+        if actual is None:
+            return
+        with self._lock:
+            self._buckets_for(model)[1].take(actual - estimated)
+
+    def _forget(self, key: str, shared: _AsyncCall) -> None:
+        if self._ainflight.get(key) is shared:
+            del self._ainflight[key]
+
+    async def _upstream_async(self, model: str, messages: list[dict], priority: str,
+                              call: Callable[[], Awaitable[dict]]) -> dict:
+        estimated = estimate_tokens(messages)
+        await self.acquire_async(model, estimated, priority)
+        self.stats["upstream"] += 1
+        result = await call()
+        usage = (result.get("raw") or {}).get("usage") or {}
+        self.settle(model, estimated, usage.get("total_tokens"))
+        return result
+
+    async def run_async(self, key: str, model: str, messages: list[dict], priority: str,
+                        call: Callable[[], Awaitable[dict]]) -> dict:
+        # Coalesces concurrent identical requests (same key, same event loop) onto one paced
+        # upstream call. The shared call runs in its own task, so a cancelled caller (the first
+        # one included) doesn't take it down for the others; it is only cancelled once every
+        # caller has gone.
+        shared = self._ainflight.get(key)
+        coalesced = shared is not None
+        if coalesced:
+            self.stats["coalesced"] += 1
+        else:
+            shared = self._ainflight[key] = _AsyncCall(
+                asyncio.ensure_future(self._upstream_async(model, messages, priority, call)))
+            shared.task.add_done_callback(lambda _t: self._forget(key, shared))
+        shared.waiters += 1
+        try:
+            result = await asyncio.shield(shared.task)
+        finally:
+            shared.waiters -= 1
+            if shared.waiters == 0 and not shared.task.done():
+                self._forget(key, shared)
+                shared.task.cancel()
+        return {**result, "coalesced": True} if coalesced else result
+
+scheduler = Scheduler()
@@ -1,6 +1,9 @@
 import json
+import threading
+import time
 from pathlib import Path
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from importlib.util import spec_from_file_location, module_from_spec
 
 def _load_router_from_file(py_path: Path, attr: str = "router"):
@@ -11,25 +14,183 @@ def _load_router_from_file(py_path: Path, attr: str = "router"):
     spec.loader.exec_module(mod)  # type: ignore
     return getattr(mod, attr, None)
 
-def load_generated_plugins(app: FastAPI, generated_root: Path) -> list[dict]:
+def _include_before_fallback(app: FastAPI, router) -> None:
+    # Routers included after startup would land behind the SPA catch-all; move them in front of it.
+    routes = app.router.routes
+    before = len(routes)
+    app.include_router(router)
+    added = routes[before:]
+    del routes[before:]
+    idx = next((i for i, r in enumerate(routes) if "{path:path}" in getattr(r, "path", "")), len(routes))
+    routes[idx:idx] = added
+    app.openapi_schema = None
+
+INDEX_FILE = ".manifest-index.json"
+INDEX_VERSION = 1
+
+class PluginIndex:
+    """Manifest index for a generated-plugins directory.
+
+    Parsed manifests are persisted in INDEX_FILE keyed by each plugin directory's mtime (and its
+    manifest's), so unchanged plugins are only stat'ed on the next start, never re-parsed.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+        self.entries: dict[str, dict] = {}
+        self.root_mtime: int | None = None
+        self._lock = threading.Lock()
+
+    def _read_persisted(self) -> dict:
+        try:
+            data = json.loads((self.root / INDEX_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return data.get("dirs", {}) if data.get("version") == INDEX_VERSION else {}
+
+    def _write_persisted(self) -> None:
+        tmp = self.root / (INDEX_FILE + ".tmp")
+        try:
+            tmp.write_text(json.dumps({"version": INDEX_VERSION, "dirs": self.entries}), encoding="utf-8")
+            tmp.replace(self.root / INDEX_FILE)
+        except OSError:
+            pass  # read-only deploys just re-parse next time
+
+    def refresh(self) -> bool:
+        # Re-scans the root; returns True if anything changed. Cheap when the root's mtime is unchanged.
+        with self._lock:
+            try:
+                root_mtime = self.root.stat().st_mtime_ns
+            except OSError:
+                return False
+            if root_mtime == self.root_mtime:
+                return False
+            known = self.entries or self._read_persisted()
+            entries: dict[str, dict] = {}
+            for d in sorted(self.root.iterdir()):
+                if not d.is_dir():
+                    continue
+                try:
+                    key = [d.stat().st_mtime_ns, (d / "manifest.json").stat().st_mtime_ns]
+                except OSError:
+                    continue
+                prev = known.get(d.name)
+                if prev is not None and prev.get("key") == key:
+                    entries[d.name] = prev
+                    continue
+                try:
+                    manifest = json.loads((d / "manifest.json").read_text(encoding="utf-8"))
+                except Exception:
+                    manifest = None
+                entries[d.name] = {"key": key, "manifest": manifest}
+            changed = entries != known
+            self.entries = entries
+            self.root_mtime = root_mtime
+            if changed or not (self.root / INDEX_FILE).exists():
+                self._write_persisted()
+                # Writing the index touches the root itself; don't treat that as a change.
+                try:
+                    self.root_mtime = self.root.stat().st_mtime_ns
+                except OSError:
+                    pass
+            return changed
+
+    def routes(self) -> list[dict]:
+        # One entry per manifest route: {"dir", "slug", "title", "prefix", "module", "attr"}.
+        out = []
+        for name, entry in self.entries.items():
+            manifest = entry.get("manifest")
+            if not isinstance(manifest, dict):
+                continue
+            for r in manifest.get("routes", []):
+                out.append({
+                    "dir": name, "slug": manifest.get("slug"), "title": manifest.get("title"),
+                    "prefix": r.get("prefix"), "module": r.get("module", "router.py"), "attr": r.get("attr", "router"),
+                })
+        return out
+
+def _mount(app: FastAPI, root: Path, route: dict, timings=None) -> bool:
+    t0 = time.perf_counter()
+    router = _load_router_from_file(root / route["dir"] / route["module"], route["attr"])
+    if router:
+        _include_before_fallback(app, router)
+    if timings is not None:
+        timings.record_plugin(f"{route['dir']}/{route['module']}", (time.perf_counter() - t0) * 1000)
+    return bool(router)
+
+def load_generated_plugins(app: FastAPI, generated_root: Path, timings=None) -> list[dict]:
     loaded = []
     if not generated_root.exists():
         return loaded
-    for d in sorted(generated_root.glob("*")):
-        if not d.is_dir():
-            continue
-        mf = d / "manifest.json"
-        if not mf.exists():
-            continue
-        try:
-            manifest = json.loads(mf.read_text(encoding="utf-8"))
-        except Exception:
-            continue
-        for r in manifest.get("routes", []):
-            mod_file = d / r.get("module", "router.py")
-            attr = r.get("attr", "router")
-            router = _load_router_from_file(mod_file, attr)
-            if router:
-                app.include_router(router)
-                loaded.append({"dir": d.name, "slug": manifest.get("slug"), "title": manifest.get("title")})
+    index = PluginIndex(generated_root)
+    index.refresh()
+    for route in index.routes():
+        if _mount(app, generated_root, route, timings):
+            loaded.append({"dir": route["dir"], "slug": route["slug"], "title": route["title"]})
     return loaded
+
+def _prefixes_of(path: str):
+    # "/api/plugins/foo/ping" -> "/api/plugins/foo/ping", "/api/plugins/foo", "/api/plugins", "/api"
+    parts = path.rstrip("/").split("/")
+    for i in range(len(parts), 1, -1):
+        yield "/".join(parts[:i])
+
+class DeferredPluginsMiddleware:
+    """ASGI middleware that mounts generated plugins lazily, one at a time (ATLAS_STARTUP_MODE=lazy).
+
+    Only the manifest index is read up front; a plugin's router module is executed on the first
+    request under its route prefix (e.g. /api/plugins/{slug}). Routes without a prefix can't be
+    matched lazily and are mounted on the first request under `prefix`. Plugins generated after
+    startup are picked up when the plugins directory's mtime changes.
+    """
+
+    def __init__(self, app, target: FastAPI, generated_root: Path, prefix: str = "/api/plugins/", timings=None):
+        self.app = app
+        self.target = target
+        self.generated_root = Path(generated_root)
+        self.prefix = prefix
+        self.timings = timings
+        self.index = PluginIndex(self.generated_root)
+        self.pending: dict[str, list[dict]] | None = None  # prefix table; "" holds prefix-less routes
+        self.mounted: set[tuple[str, str]] = set()
+        self.mounted_prefixes: set[str] = set()
+        self._lock = threading.Lock()
+
+    def _sync_table(self) -> None:
+        # Called with the lock held.
+        if self.index.refresh() or self.pending is None:
+            table: dict[str, list[dict]] = {}
+            for r in self.index.routes():
+                if (r["dir"], r["module"]) not in self.mounted:
+                    table.setdefault((r["prefix"] or "").rstrip("/"), []).append(r)
+            self.pending = table
+
+    def _load_for(self, path: str) -> None:
+        with self._lock:
+            first = self.pending is None
+            t0 = time.perf_counter()
+            self._sync_table()
+            if first and self.timings is not None:
+                self.timings.record("plugins_index", (time.perf_counter() - t0) * 1000)
+            for key in ["", *_prefixes_of(path)]:
+                for r in self.pending.pop(key, []):
+                    self.mounted.add((r["dir"], r["module"]))
+                    if key:
+                        self.mounted_prefixes.add(key)
+                    _mount(self.target, self.generated_root, r, self.timings)
+
+    def _wanted(self, path: str) -> bool:
+        # Lock-free fast path: nothing to do once the owning plugin is mounted.
+        pending = self.pending
+        if pending is None or "" in pending:
+            return True
+        prefixes = list(_prefixes_of(path))
+        if any(p in pending for p in prefixes):
+            return True
+        # Unknown prefix: rescan in case the plugin was generated after startup (a stat when unchanged).
+        return not any(p in self.mounted_prefixes for p in prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(self.prefix) and self._wanted(scope["path"]):
+            await run_in_threadpool(self._load_for, scope["path"])
+        await self.app(scope, receive, send)
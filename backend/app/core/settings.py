@@ -1,22 +1,68 @@
+import os
+import threading
+import time
 from datetime import datetime, timezone
 from .db import db
 
+# In-process cache of the settings table. Reads are served from memory; set_setting writes
+# through. Other workers' writes are picked up by polling settings_version (bumped by
+# triggers) at most once per POLL_S seconds. _cache is never mutated in place: writers build a
+# new dict and swap the reference, so lock-free readers always see a complete snapshot.
+POLL_S = float(os.getenv("ATLAS_SETTINGS_POLL_S", "1.0"))
+
+_lock = threading.Lock()
+_cache: dict[str, tuple[str, str]] = {}
+_version: int | None = None
+_checked_at = 0.0
+
+def _current_version(conn) -> int:
+    row = conn.execute("SELECT v FROM settings_version WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+def _refresh() -> None:
+    global _cache, _version, _checked_at
+    now = time.monotonic()
+    if _version is not None and now - _checked_at < POLL_S:
+        return
+    with _lock:
+        if _version is not None and now - _checked_at < POLL_S:
+            return
+        with db() as conn:
+            v = _current_version(conn)
+            if v != _version:
+                rows = conn.execute("SELECT k,v,updated_at FROM settings").fetchall()
+                _cache = {k: (val, ts) for k, val, ts in rows}
+                _version = v
+        _checked_at = now
+
+def invalidate() -> None:
+    global _version
+    with _lock:
+        _version = None
+
 def get_setting(k: str) -> str | None:
-    with db() as conn:
-        row = conn.execute("SELECT v FROM settings WHERE k = ?", (k,)).fetchone()
-        return row[0] if row else None
+    _refresh()
+    hit = _cache.get(k)
+    return hit[0] if hit else None
 
 def set_setting(k: str, v: str) -> None:
+    global _cache, _version
     ts = datetime.now(timezone.utc).isoformat()
-    with db() as conn:
-        conn.execute(
-            "INSERT INTO settings(k,v,updated_at) VALUES (?,?,?) "
-            "ON CONFLICT(k) DO UPDATE SET v=excluded.v, updated_at=excluded.updated_at",
-            (k, v, ts),
-        )
+    with _lock:
+        with db() as conn:
+            conn.execute(
+                "INSERT INTO settings(k,v,updated_at) VALUES (?,?,?) "
+                "ON CONFLICT(k) DO UPDATE SET v=excluded.v, updated_at=excluded.updated_at",
+                (k, v, ts),
+            )
+            new_version = _current_version(conn)
+        # Only our write happened since the last load: patch the cache; otherwise reload on next read.
+        if _version is not None and new_version == _version + 1:
+            _cache = {**_cache, k: (v, ts)}
+            _version = new_version
+        else:
+            _version = None
 
 def list_settings(prefix: str | None = None) -> list[tuple[str,str,str]]:
-    with db() as conn:
-        if prefix:
-            return list(conn.execute("SELECT k,v,updated_at FROM settings WHERE k LIKE ? ORDER BY k", (prefix + "%",)))
-        return list(conn.execute("SELECT k,v,updated_at FROM settings ORDER BY k"))
+    _refresh()
+    return sorted((k, val, ts) for k, (val, ts) in _cache.items() if not prefix or k.startswith(prefix))
@@ -0,0 +1,33 @@
+import os
+import time
+
+STARTUP_MODE = os.getenv("ATLAS_STARTUP_MODE", "eager").strip().lower()
+
+def lazy_startup() -> bool:
+    # lazy: each generated plugin is executed on the first request under its prefix instead of at import.
+    return STARTUP_MODE == "lazy"
+
+class StartupTimings:
+    def __init__(self) -> None:
+        self.t0 = time.perf_counter()
+        self._last = self.t0
+        self.phases: dict[str, float] = {}
+        self.plugins: dict[str, float] = {}
+
+    def mark(self, phase: str) -> None:
+        # Records the time spent since the previous mark (or since construction).
+        now = time.perf_counter()
+        self.phases[phase] = round((now - self._last) * 1000, 2)
+        self._last = now
+
+    def record(self, phase: str, ms: float) -> None:
+        # For deferred work that runs after startup (not included in total_ms).
+        self.phases[phase] = round(ms, 2)
+
+    def record_plugin(self, name: str, ms: float) -> None:
+        # Per generated-plugin module load time (at startup when eager, on first use when lazy).
+        self.plugins[name] = round(ms, 2)
+
+    def as_dict(self) -> dict:
+        return {"mode": STARTUP_MODE, "phases_ms": dict(self.phases), "total_ms": round((self._last - self.t0) * 1000, 2),
+                "plugins_ms": dict(self.plugins)}
@@ -0,0 +1,153 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+import threading
+from pathlib import Path
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+# Vite emits content-hashed names (index-CyEX-_nG.js); those never change, so they're immutable.
+HASHED_NAME = re.compile(r"-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+COMPRESSIBLE = {".js", ".mjs", ".css", ".html", ".svg", ".json", ".map", ".txt", ".xml", ".wasm"}
+MIN_COMPRESS_BYTES = int(os.getenv("ATLAS_STATIC_MIN_COMPRESS_BYTES", "1024"))
+
+try:
+    import brotli
+except ImportError:  # optional: only .gz sidecars without it
+    brotli = None
+
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")] if brotli is not None else [("gzip", ".gz")]
+
+def accepted_encodings(headers: Headers) -> set[str]:
+    accept = headers.get("accept-encoding", "")
+    out = set()
+    for part in accept.split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            out.add(name.strip().lower())
+    return out
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def precompress_dir(directory: str | os.PathLike) -> dict:
+    # Writes .br/.gz sidecars next to compressible files; stale or missing sidecars are rebuilt.
+    # When an encoding doesn't shrink a file, an empty foo.js.gz.skip marker records that so
+    # the next startup doesn't compress it again (a newer source invalidates the marker).
+    stats = {"written": 0, "fresh": 0, "skipped": 0}
+    root = Path(directory)
+    if not root.is_dir():
+        return stats
+    for path in root.rglob("*"):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE:
+            continue
+        st = path.stat()
+        if st.st_size < MIN_COMPRESS_BYTES:
+            stats["skipped"] += 1
+            continue
+        data = None
+        for encoding, ext in ENCODINGS:
+            side = path.with_name(path.name + ext)
+            marker = side.with_name(side.name + ".skip")
+            if side.exists() and side.stat().st_mtime >= st.st_mtime:
+                stats["fresh"] += 1
+                continue
+            if marker.exists() and marker.stat().st_mtime >= st.st_mtime:
+                stats["skipped"] += 1
+                continue
+            data = data if data is not None else path.read_bytes()
+            packed = _compress(data, encoding)
+            if len(packed) >= len(data):
+                side.unlink(missing_ok=True)
+                marker.touch()
+                stats["skipped"] += 1
+                continue
+            tmp = side.with_name(side.name + ".tmp")
+            tmp.write_bytes(packed)
+            os.replace(tmp, side)
+            marker.unlink(missing_ok=True)
+            stats["written"] += 1
+    return stats
+
+class PrecompressedStaticFiles(StaticFiles):
+    # Serves foo.js.br / foo.js.gz when the client accepts it, with Vary, long-lived immutable
+    # caching for hashed names and ETag/304 per variant (FileResponse etags differ by file).
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+        cache_control = IMMUTABLE if HASHED_NAME.search(full_path) else REVALIDATE
+        accepted = accepted_encodings(request_headers)
+        response = None
+        if Path(full_path).suffix in COMPRESSIBLE:
+            for encoding, ext in ENCODINGS:
+                if encoding not in accepted:
+                    continue
+                try:
+                    side_stat = os.stat(full_path + ext)
+                except OSError:
+                    continue
+                if side_stat.st_mtime < stat_result.st_mtime:
+                    continue
+                response = FileResponse(full_path + ext, status_code=status_code, stat_result=side_stat,
+                                        media_type=media_type, headers={"Content-Encoding": encoding})
+                break
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers["Cache-Control"] = cache_control
+        response.headers["Vary"] = "Accept-Encoding"
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+class SpaShell:
+    # index.html held in memory (plus a gzip variant); reloaded only when its mtime changes.
+    # Body, gzip body and ETag live in one tuple that is swapped in a single assignment, so a
+    # request never pairs the new body with the old ETag.
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._snapshot: tuple[int, bytes, bytes, str] | None = None  # (mtime_ns, body, gzip, etag)
+
+    def _load(self) -> tuple[int, bytes, bytes, str] | None:
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            return None
+        snap = self._snapshot
+        if snap is None or snap[0] != mtime:
+            with self._lock:
+                snap = self._snapshot
+                if snap is None or snap[0] != mtime:
+                    body = self.path.read_bytes()
+                    snap = (mtime, body, gzip.compress(body, mtime=0), '"' + hashlib.sha256(body).hexdigest()[:20] + '"')
+                    self._snapshot = snap
+        return snap
+
+    def response(self, request_headers: Headers) -> Response | None:
+        snap = self._load()
+        if snap is None:
+            return None
+        _, body, gz, base_etag = snap
+        use_gzip = "gzip" in accepted_encodings(request_headers) and len(gz) < len(body)
+        etag = base_etag[:-1] + '-gz"' if use_gzip else base_etag
+        headers = {"ETag": etag, "Cache-Control": REVALIDATE, "Vary": "Accept-Encoding"}
+        if etag in [t.strip(" W/") for t in request_headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=headers)
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+        return Response(gz if use_gzip else body, media_type="text/html; charset=utf-8", headers=headers)
+
+if __name__ == "__main__":
+    # Build-time precompression: python -m backend.app.core.static_assets backend/app/static
+    target = sys.argv[1] if len(sys.argv) > 1 else str(Path(__file__).resolve().parents[1] / "static")
+    print(precompress_dir(target))
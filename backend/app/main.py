@@ -1,42 +1,79 @@
+import logging
 import os
+from .core.startup import StartupTimings, lazy_startup
+_timings = StartupTimings()
 from pathlib import Path
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse
 from .routers.health import router as health_router
 from .routers.settings_api import router as settings_router
 from .routers.chat_api import router as chat_router
 from .routers.admin_factory import router as admin_factory_router
-from .core.plugin_loader import load_generated_plugins
+from .core.plugin_loader import load_generated_plugins, DeferredPluginsMiddleware
+from .core.audit import sink as audit_sink
+from .core.static_assets import PrecompressedStaticFiles, SpaShell, precompress_dir
+_timings.mark("imports")
 
 BASE_DIR = Path(__file__).resolve().parent
 STATIC_DIR = BASE_DIR / "static"
 INDEX_HTML = STATIC_DIR / "index.html"
-GENERATED_PLUGINS_DIR = BASE_DIR / "plugins_generated"
+GENERATED_PLUGINS_DIR = Path(os.getenv("ATLAS_GENERATED_PLUGINS_DIR", str(BASE_DIR / "plugins_generated")))
 
 app = FastAPI(title="Atlas v6 Unified", version="6.0.0")
+app.state.startup_timings = _timings
+
+@app.on_event("shutdown")
+def _flush_audit():
+    audit_sink.close()
+
+@app.on_event("shutdown")
+async def _close_http_client():
+    from .core.http_client import aclose_client
+    await aclose_client()
 
 # API
 app.include_router(health_router)
 app.include_router(settings_router)
 app.include_router(chat_router)
 app.include_router(admin_factory_router)
+_timings.mark("routers")
 
-_loaded = load_generated_plugins(app, GENERATED_PLUGINS_DIR)
+if lazy_startup():
+    app.add_middleware(DeferredPluginsMiddleware, target=app, generated_root=GENERATED_PLUGINS_DIR, timings=_timings)
+    _loaded = None
+else:
+    _loaded = load_generated_plugins(app, GENERATED_PLUGINS_DIR, timings=_timings)
+_timings.mark("plugins")
 
 # Static (React build copied into backend/app/static)
 if STATIC_DIR.exists():
-    app.mount("/assets", StaticFiles(directory=str(STATIC_DIR / "assets")), name="assets")
+    app.mount("/assets", PrecompressedStaticFiles(directory=str(STATIC_DIR / "assets")), name="assets")
+
+    @app.on_event("startup")
+    def _precompress_assets():
+        # No-op when ops/build_frontend already wrote fresh .gz/.br sidecars.
+        try:
+            precompress_dir(STATIC_DIR / "assets")
+        except OSError as e:
+            logging.getLogger("atlas.static").warning("asset precompression skipped: %s", e)
+_timings.mark("static")
+
+spa_shell = SpaShell(INDEX_HTML)
 
 @app.get("/", response_class=HTMLResponse)
-def root():
-    if INDEX_HTML.exists():
-        return INDEX_HTML.read_text(encoding="utf-8")
+def root(request: Request):
+    shell = spa_shell.response(request.headers)
+    if shell is not None:
+        return shell
     return "<h1>Atlas v6 Unified</h1><p>Frontend build missing. Run ops/build_frontend.(ps1|sh)</p>"
 
 @app.get("/{path:path}", response_class=HTMLResponse)
-def spa_fallback(path: str):
+def spa_fallback(path: str, request: Request):
     # Single-page app fallback
-    if INDEX_HTML.exists():
-        return INDEX_HTML.read_text(encoding="utf-8")
+    shell = spa_shell.response(request.headers)
+    if shell is not None:
+        return shell
     return "<h1>Atlas v6 Unified</h1><p>Frontend build missing.</p>"
+
+_timings.mark("spa")
+logging.getLogger("atlas.startup").info("startup %s", _timings.as_dict())
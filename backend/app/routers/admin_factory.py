@@ -8,7 +8,7 @@ from ..factory_engine.engine import generate_plugin
 
 router = APIRouter(prefix="/api/admin/factory", tags=["admin-factory"])
 
-GENERATED_DIR = os.path.join(os.path.dirname(__file__), "..", "plugins_generated")
+GENERATED_DIR = os.getenv("ATLAS_GENERATED_PLUGINS_DIR", os.path.join(os.path.dirname(__file__), "..", "plugins_generated"))
 
 class SpecIn(BaseModel):
     spec: dict
@@ -1,6 +1,15 @@
-from fastapi import APIRouter
+import asyncio
+import json
+import time
+from typing import AsyncIterator
+from fastapi import APIRouter, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from ..core.llm_gateway import chat
+from starlette.concurrency import run_in_threadpool
+from ..core.llm_gateway import achat, chat_stream
+from ..core.llm_cache import cache
+from ..core.llm_scheduler import scheduler, PRIORITIES
+from ..core.chat_history import save_message, recent_messages
 from ..core.audit import audit
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
@@ -8,10 +17,77 @@ router = APIRouter(prefix="/api/chat", tags=["chat"])
 class ChatIn(BaseModel):
     messages: list[dict] = Field(default_factory=list)
     temperature: float = 0.2
+    stream: bool = False
+    priority: str = "interactive"  # interactive | batch
+
+def _ms(t0: float) -> float:
+    return round((time.perf_counter() - t0) * 1000, 1)
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _finish_stream(final: dict, parts: list[str], ttft_ms: float | None, total_ms: float) -> None:
+    if not final.get("ok") and parts:
+        # Aborted mid-stream: keep what the user already saw.
+        save_message("assistant", "".join(parts), {**final, "stream": True, "ttft_ms": ttft_ms,
+                                                   "total_ms": total_ms, "incomplete": True})
+    audit("chat.response", {"ok": bool(final.get("ok")), "stream": True, "ttft_ms": ttft_ms, "total_ms": total_ms})
+
+async def _relay(payload: ChatIn, t0: float, bypass_cache: bool) -> AsyncIterator[str]:
+    # Relays provider deltas as SSE; the assistant message is persisted and chat.response
+    # audited once, when the stream ends (also if the client disconnects mid-stream).
+    parts: list[str] = []
+    ttft_ms = None
+    final: dict = {"ok": False, "error": "stream aborted"}
+    try:
+        async for ev in chat_stream(payload.messages, payload.temperature, bypass_cache, payload.priority):
+            if ev["type"] == "delta":
+                if ttft_ms is None:
+                    ttft_ms = _ms(t0)
+                parts.append(ev["content"])
+                yield _sse("delta", {"content": ev["content"]})
+            else:
+                final = {k: v for k, v in ev.items() if k != "type"}
+        meta = {**final, "stream": True, "ttft_ms": ttft_ms, "total_ms": _ms(t0)}
+        if final.get("ok"):
+            meta["message_id"] = await run_in_threadpool(save_message, "assistant", "".join(parts), meta)
+        yield _sse("done" if final.get("ok") else "error", meta)
+    finally:
+        # Off the event loop, and shielded so a disconnect (cancellation) can't cut it short.
+        await asyncio.shield(run_in_threadpool(_finish_stream, final, parts, ttft_ms, _ms(t0)))
 
 @router.post("")
-def chat_post(payload: ChatIn):
-    audit("chat.request", {"n": len(payload.messages)})
-    result = chat(payload.messages, payload.temperature)
-    audit("chat.response", {"ok": bool(result.get("ok"))})
+async def chat_post(payload: ChatIn, response: Response, stream: bool = False,
+                    x_llm_cache: str | None = Header(default=None), x_llm_priority: str | None = Header(default=None)):
+    t0 = time.perf_counter()
+    if x_llm_priority:
+        payload.priority = x_llm_priority.strip().lower()
+    if payload.priority not in PRIORITIES:
+        raise HTTPException(status_code=422, detail=f"priority must be one of {sorted(PRIORITIES)}")
+    bypass_cache = (x_llm_cache or "").strip().lower() == "bypass"
+    audit("chat.request", {"n": len(payload.messages), "stream": payload.stream or stream})
+    if payload.stream or stream:
+        return StreamingResponse(_relay(payload, t0, bypass_cache), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    result = await achat(payload.messages, payload.temperature, bypass_cache, payload.priority)
+    result["latency_ms"] = _ms(t0)
+    if "cache" in result:
+        response.headers["X-LLM-Cache"] = result["cache"]
+    if result.get("ok") and result.get("content") is not None:
+        result["message_id"] = await run_in_threadpool(
+            save_message, "assistant", result["content"],
+            {"model": result.get("model"), "stream": False, "total_ms": result["latency_ms"]})
+    audit("chat.response", {"ok": bool(result.get("ok")), "cache": result.get("cache")})
     return result
+
+@router.get("/cache")
+def cache_stats():
+    return {"ok": True, "max_temperature": cache.max_temperature, "ttl_s": cache.ttl_s, "stats": dict(cache.stats)}
+
+@router.get("/scheduler")
+def scheduler_stats():
+    return {"ok": True, "stats": dict(scheduler.stats)}
+
+@router.get("/history")
+def chat_history(limit: int = 50):
+    return {"ok": True, "items": recent_messages(max(1, min(limit, 500)))}
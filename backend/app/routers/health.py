@@ -1,6 +1,11 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 router = APIRouter()
 
 @router.get("/healthz")
 def healthz():
     return {"ok": True}
+
+@router.get("/healthz/startup")
+def startup_timings(request: Request):
+    timings = getattr(request.app.state, "startup_timings", None)
+    return {"ok": True, "startup": timings.as_dict() if timings else None}
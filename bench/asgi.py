@@ -0,0 +1,54 @@
+"""Minimal in-process ASGI client: no sockets, no server, no httpx dependency."""
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any
+from urllib.parse import urlencode
+
+class AsgiClient:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def request(self, method: str, path: str, params: dict | None = None, json_body: Any = None,
+                      body: bytes = b"", headers: dict | None = None) -> tuple[int, bytes]:
+        hdrs = [(k.lower().encode(), str(v).encode()) for k, v in (headers or {}).items()]
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            hdrs.append((b"content-type", b"application/json"))
+        hdrs.append((b"content-length", str(len(body)).encode()))
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method.upper(), "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": urlencode(params or {}).encode(), "root_path": "",
+            "headers": hdrs, "client": ("127.0.0.1", 0), "server": ("bench", 80),
+        }
+        pending = [{"type": "http.request", "body": body, "more_body": False}]
+        status, chunks = 0, []
+        done = asyncio.Event()
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            # Like a real client: only "disconnect" once the response has been fully sent.
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(msg):
+            nonlocal status
+            if msg["type"] == "http.response.start":
+                status = msg["status"]
+            elif msg["type"] == "http.response.body":
+                chunks.append(msg.get("body", b""))
+                if not msg.get("more_body", False):
+                    done.set()
+
+        await self.app(scope, receive, send)
+        done.set()
+        return status, b"".join(chunks)
+
+    async def get(self, path: str, **kw) -> tuple[int, bytes]:
+        return await self.request("GET", path, **kw)
+
+    async def post(self, path: str, **kw) -> tuple[int, bytes]:
+        return await self.request("POST", path, **kw)
@@ -0,0 +1,84 @@
+"""Cold-start benchmark for backend.app.main: process spawn -> first healthy /healthz.
+
+Each run is a fresh interpreter (nothing warm in sys.modules) against a temp plugins dir
+populated with --plugins generated plugins. Exits 1 if the median of the checked mode
+exceeds --budget-ms.
+
+Run from the repo root:
+    python -m bench.cold_start --runs 5 --plugins 100 --budget-ms 1500
+"""
+from __future__ import annotations
+
+import argparse, json, os, statistics, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executed in the child: import the app, run lifespan startup, serve one GET /healthz in-process.
+CHILD = r"""
+import asyncio, json, time
+t0 = time.perf_counter()
+from backend.app.main import app
+t_import = time.perf_counter()
+from bench.asgi import AsgiClient
+
+async def main():
+    async with app.router.lifespan_context(app):
+        status, _ = await AsgiClient(app).get("/healthz")
+    return status
+
+status = asyncio.run(main())
+print(json.dumps({"status": status, "import_ms": (t_import - t0) * 1000,
+                  "in_process_ms": (time.perf_counter() - t0) * 1000,
+                  "startup": app.state.startup_timings.as_dict()}))
+"""
+
+def _make_plugins(root: str, n: int) -> None:
+    sys.path.insert(0, ROOT)
+    from backend.app.factory_engine.engine import generate_plugin
+    for i in range(n):
+        generate_plugin(root, {"plugin_slug": f"bench-plugin-{i}", "title": f"Bench plugin {i}"})
+
+def _run_once(mode: str, plugins_dir: str, db_path: str) -> dict:
+    env = dict(os.environ, ATLAS_STARTUP_MODE=mode, ATLAS_GENERATED_PLUGINS_DIR=plugins_dir,
+               ATLAS_DB_PATH=db_path, PYTHONDONTWRITEBYTECODE="1")
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    wall_ms = (time.perf_counter() - t0) * 1000
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    if result["status"] != 200:
+        raise RuntimeError(f"/healthz returned {result['status']}")
+    result["wall_ms"] = wall_ms
+    return result
+
+def main_cli(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--plugins", type=int, default=100)
+    ap.add_argument("--modes", default="eager,lazy")
+    ap.add_argument("--check", default="lazy", help="mode whose median is held to --budget-ms")
+    ap.add_argument("--budget-ms", type=float, default=1500.0)
+    args = ap.parse_args(argv)
+
+    medians = {}
+    with tempfile.TemporaryDirectory() as td:
+        plugins_dir = os.path.join(td, "plugins_generated")
+        os.makedirs(plugins_dir)
+        _make_plugins(plugins_dir, args.plugins)
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            runs = [_run_once(mode, plugins_dir, os.path.join(td, f"{mode}.db")) for _ in range(args.runs)]
+            walls = sorted(r["wall_ms"] for r in runs)
+            medians[mode] = statistics.median(walls)
+            phases = runs[-1]["startup"]["phases_ms"]
+            print(f"{mode:6s} plugins={args.plugins} runs={args.runs} "
+                  f"wall median={medians[mode]:.1f}ms max={walls[-1]:.1f}ms "
+                  f"import median={statistics.median(r['import_ms'] for r in runs):.1f}ms")
+            print("       phases_ms " + ", ".join(f"{k}={v}" for k, v in phases.items()))
+
+    if args.check in medians:
+        ok = medians[args.check] <= args.budget_ms
+        print(f"budget {args.check}: {medians[args.check]:.1f}ms / {args.budget_ms:.0f}ms -> {'OK' if ok else 'OVER'}")
+        return 0 if ok else 1
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main_cli())
@@ -0,0 +1,65 @@
+"""Compare PMX API throughput: pooled WAL connections vs connect/close per request.
+
+Run from the repo root:
+    python -m bench.db_pool --threads 8 --requests 4000
+"""
+from __future__ import annotations
+
+import argparse, os, sqlite3, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+def _legacy_db(path: str):
+    # Behaviour of main.db() before the pool: fresh connection, rollback journal, close after use.
+    @contextmanager
+    def db():
+        con = sqlite3.connect(path)
+        con.row_factory = sqlite3.Row
+        try:
+            yield con
+            con.commit()
+        finally:
+            con.close()
+    return db
+
+def _run(main, n_requests: int, threads: int) -> float:
+    project_id = main.create_project(main.ProjectIn(name="bench"))["id"]
+
+    def one(i: int):
+        if i % 4 == 0:
+            main.list_tasks(project_id=project_id, after=None, limit=None, fmt=None, accept=None)
+        else:
+            main.create_task(main.TaskIn(project_id=project_id, title=f"task {i}"))
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        list(ex.map(one, range(n_requests)))
+    return n_requests / (time.perf_counter() - t0)
+
+def main_cli(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=4000)
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as td:
+        os.environ["ATLAS_DB_PATH"] = os.path.join(td, "pooled.db")
+        os.environ["ATLAS_UPLOAD_DIR"] = os.path.join(td, "uploads")
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        import main
+
+        pooled = _run(main, args.requests, args.threads)
+        main.pool.close_all()
+
+        legacy_path = os.path.join(td, "legacy.db")
+        main.db = _legacy_db(legacy_path)
+        main.init_db()
+        legacy = _run(main, args.requests, args.threads)
+
+    print(f"threads={args.threads} requests={args.requests}")
+    print(f"legacy connect/close : {legacy:10.1f} req/s")
+    print(f"pooled WAL           : {pooled:10.1f} req/s  ({pooled / legacy:.2f}x)")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main_cli())
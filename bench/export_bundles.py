@@ -0,0 +1,104 @@
+"""Compare export.py builds: staged copy + re-zip (old) vs spliced template bundles, by module count.
+
+Generates a synthetic templates tree (core, N modules, one deploy profile) in a temp dir.
+"bundle cold" includes packing the bundles; "bundle warm" reuses the packed, mmapped bundles.
+
+Run from the repo root:
+    python -m bench.export_bundles --modules 1,5,20,50 --files 30 --runs 5
+"""
+from __future__ import annotations
+
+import argparse, hashlib, os, random, shutil, statistics, string, sys, tempfile, time, zipfile
+from pathlib import Path
+
+def _make_templates(root: Path, modules: int, files: int, seed: int = 7) -> None:
+    rnd = random.Random(seed)
+    words = ["".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(3, 9))) for _ in range(400)]
+
+    def tree(d: Path, n: int) -> None:
+        for i in range(n):
+            p = d / f"pkg{i % 4}" / f"file_{i}.py"
+            p.parent.mkdir(parents=True, exist_ok=True)
+            p.write_text("\n".join(" ".join(rnd.choices(words, k=12)) for _ in range(rnd.randint(40, 200))), encoding="utf-8")
+
+    tree(root / "core" / "backend", files)
+    tree(root / "core" / "frontend", files)
+    for m in range(modules):
+        tree(root / "modules" / f"mod{m}", files)
+    tree(root / "deploy_profiles" / "onprem_dockercompose", 4)
+
+def _staged_export(templates: Path, out_dir: Path, spec: dict) -> str:
+    # Behaviour of export_platform before bundles: copy into a temp tree, walk it again to zip,
+    # then read the whole zip back to hash it.
+    def copytree(src: Path, dst: Path):
+        for p in src.rglob("*"):
+            if p.is_dir():
+                continue
+            target = dst / p.relative_to(src)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(p.read_bytes())
+
+    with tempfile.TemporaryDirectory(dir=out_dir) as td:
+        out = Path(td) / f"{spec['platform']['slug']}_onprem_v1"
+        out.mkdir(parents=True)
+        copytree(templates / "core" / "backend", out / "backend")
+        copytree(templates / "core" / "frontend", out / "frontend")
+        for m in spec["modules"]:
+            copytree(templates / "modules" / m, out / "backend" / "modules" / m)
+        copytree(templates / "deploy_profiles" / "onprem_dockercompose", out / "ops")
+        (out / "README_DEPLOY.md").write_text("Run: docker compose up -d\n", encoding="utf-8")
+        (out / ".env.example").write_text("JWT_SECRET=change_me\nOCR_API_KEY=change_me\n", encoding="utf-8")
+        zip_path = Path(td) / f"{out.name}.zip"
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as z:
+            for p in out.rglob("*"):
+                if p.is_file():
+                    z.write(p, p.relative_to(out))
+        return hashlib.sha256(zip_path.read_bytes()).hexdigest()
+
+def _ms(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+def main_cli(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--modules", default="1,5,20,50")
+    ap.add_argument("--files", type=int, default=30, help="files per template dir")
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args(argv)
+    counts = [int(x) for x in args.modules.split(",") if x.strip()]
+
+    print(f"{'modules':>7} {'staged ms':>10} {'bundle cold':>12} {'bundle warm':>12} {'speedup':>8} {'zip KB':>8}")
+    with tempfile.TemporaryDirectory() as td:
+        # export.py writes through engine's export index, which reads EXPORT_DIR at import
+        os.environ["ATLAS_EXPORT_DIR"] = str(Path(td) / "exports")
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        import export
+
+        templates = Path(td) / "templates"
+        _make_templates(templates, max(counts), args.files)
+        export.TEMPLATES = templates
+        for n in counts:
+            spec = {"platform": {"slug": f"bench{n}"}, "modules": [f"mod{m}" for m in range(n)]}
+
+            def cold():
+                export.BUNDLE_DIR = Path(td) / f"bundles_cold_{time.perf_counter_ns()}"
+                export._bundles.clear()
+                export.export_platform(spec)
+
+            staged = _ms(lambda: _staged_export(templates, export.EXPORT_DIR, spec), args.runs)
+            bundle_cold = _ms(cold, args.runs)
+            shutil.rmtree(export.BUNDLE_DIR, ignore_errors=True)
+            export.BUNDLE_DIR = Path(td) / "bundles"
+            export._bundles.clear()
+            export.export_platform(spec)
+            bundle_warm = _ms(lambda: export.export_platform(spec), args.runs)
+            size_kb = (export.EXPORT_DIR / f"bench{n}_onprem_v1.zip").stat().st_size / 1024
+            print(f"{n:>7} {staged:>10.1f} {bundle_cold:>12.1f} {bundle_warm:>12.1f} {staged / bundle_warm:>7.1f}x {size_kb:>8.0f}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main_cli())
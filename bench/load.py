@@ -0,0 +1,242 @@
+"""In-process load test for the PMX app (main.py) and backend.app.main (+ overlay v5).
+
+Seeds a temp database with --rows rows, then drives each app through bench.asgi.AsgiClient
+with --concurrency concurrent clients and reports req/s and p50/p95/p99 per route.
+Results can be written as JSON (--out) and diffed against an earlier run (--baseline).
+
+Run from the repo root:
+    python -m bench.load --targets pmx,backend --rows 10000 --concurrency 32 --requests 5000 --out bench_results.json
+    python -m bench.load --rows 1000000 --baseline bench_results.json
+"""
+from __future__ import annotations
+
+import argparse, asyncio, json, os, platform, random, subprocess, sys, tempfile, time, uuid
+from typing import Any, Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.asgi import AsgiClient
+
+SEED_CHUNK = 50_000
+
+# A scenario is a weighted list of (route label, method, path, request kwargs factory).
+Scenario = list[tuple[str, int, str, str, Callable[[random.Random], dict]]]
+
+def _chunks(n: int, size: int = SEED_CHUNK):
+    for start in range(0, n, size):
+        yield start, min(size, n - start)
+
+# --- PMX (main.py) ---
+
+def _seed_pmx(main, rows: int) -> dict:
+    n_projects = 20
+    projects = [str(uuid.uuid4()) for _ in range(n_projects)]
+    hot = projects[0]  # half of all tasks land in one large project
+    now = int(time.time())
+    with main.db() as con:
+        con.executemany("INSERT INTO projects(id,name,description,created_at) VALUES(?,?,?,?)",
+                        [(p, f"Project {i}", "", now - i) for i, p in enumerate(projects)])
+    statuses = ["todo", "doing", "review", "done"]
+    for start, n in _chunks(rows):
+        with main.db() as con:
+            con.executemany(
+                "INSERT INTO tasks(id,project_id,title,status,due_date,created_at) VALUES(?,?,?,?,?,?)",
+                [(str(uuid.uuid4()), hot if i % 2 else projects[i % n_projects], f"Task {i} concrete pour level {i % 40}",
+                  statuses[i % 4], None, now - i) for i in range(start, start + n)])
+    for start, n in _chunks(max(1, rows // 10)):
+        with main.db() as con:
+            con.executemany(
+                "INSERT INTO files(id,project_id,filename,path,mime,size,created_at) VALUES(?,?,?,?,?,?,?)",
+                [(str(uuid.uuid4()), projects[i % n_projects], f"drawing_{i}.pdf", None, "application/pdf", 1024 * (i % 500), now - i)
+                 for i in range(start, start + n)])
+            con.executemany(
+                "INSERT INTO chat_logs(id,project_id,role,content,created_at,content_hash) VALUES(?,?,?,?,?,?)",
+                [(str(uuid.uuid4()), projects[i % n_projects], "user", f"message {i} about the slab", now - i, uuid.uuid4().hex)
+                 for i in range(start, start + n)])
+    return {"projects": projects, "hot": hot}
+
+def _pmx_scenario(seed: dict) -> Scenario:
+    projects, hot = seed["projects"], seed["hot"]
+    pick = lambda rnd: rnd.choice(projects)
+    return [
+        ("GET /healthz", 1, "GET", "/healthz", lambda rnd: {}),
+        ("GET /api/projects", 2, "GET", "/api/projects", lambda rnd: {}),
+        ("GET /api/tasks?project_id", 6, "GET", "/api/tasks", lambda rnd: {"params": {"project_id": pick(rnd), "limit": 100}}),
+        ("GET /api/tasks?project_id=hot", 2, "GET", "/api/tasks", lambda rnd: {"params": {"project_id": hot, "limit": 100}}),
+        ("GET /api/files?project_id", 2, "GET", "/api/files", lambda rnd: {"params": {"project_id": pick(rnd), "limit": 100}}),
+        ("GET /api/projects/{id}/stats", 3, "GET", "", lambda rnd: {"path": f"/api/projects/{pick(rnd)}/stats"}),
+        ("GET /api/search", 2, "GET", "/api/search", lambda rnd: {"params": {"q": f"concrete level {rnd.randrange(40)}", "limit": 20}}),
+        ("POST /api/tasks", 4, "POST", "/api/tasks",
+         lambda rnd: {"json_body": {"project_id": pick(rnd), "title": f"bench task {rnd.random()}"}}),
+        ("POST /api/chat", 3, "POST", "/api/chat",
+         lambda rnd: {"json_body": {"project_id": pick(rnd), "messages": [{"role": "user", "content": f"hello {rnd.random()}"}]}}),
+    ]
+
+def _setup_pmx(td: str, rows: int):
+    os.environ["ATLAS_DB_PATH"] = os.path.join(td, "pmx.db")
+    os.environ["ATLAS_UPLOAD_DIR"] = os.path.join(td, "uploads")
+    import main
+    seed = _seed_pmx(main, rows)
+    return main.app, _pmx_scenario(seed)
+
+# --- backend.app.main with the v5 overlay ---
+
+def _install_overlay(app) -> None:
+    # Same route precedence as apply_atlas_unified_overlay_v5.py, which injects
+    # install_overlay_v5(app) right after app = FastAPI(...): overlay routes come first.
+    sys.path.insert(0, os.path.join(ROOT, "atlas-patch"))
+    from atlas_overlay_v5 import install_overlay_v5
+    before = list(app.router.routes)
+    install_overlay_v5(app)
+    added = [r for r in app.router.routes if r not in before]
+    app.router.routes[:] = added + before
+
+def _seed_backend(rows: int) -> None:
+    from atlas_overlay_v5.common import connect, now_iso
+    con = connect()
+    try:
+        for start, n in _chunks(rows):
+            con.executemany("INSERT INTO chat_history (id, role, content, meta_json, created_at) VALUES (?,?,?,?,?)",
+                            [(uuid.uuid4().hex, "user" if i % 2 else "assistant", f"message {i}", "{}", now_iso())
+                             for i in range(start, start + n)])
+        for start, n in _chunks(max(1, rows // 10)):
+            con.executemany("INSERT INTO learn_items (id,title,source,url,tags,content,created_at) VALUES (?,?,?,?,?,?,?)",
+                            [(uuid.uuid4().hex, f"Item {i} structural steel", "bench", "", "steel,bench", "x" * 200, now_iso())
+                             for i in range(start, start + n)])
+        con.commit()
+    finally:
+        con.close()
+
+def _backend_scenario() -> Scenario:
+    spec = {"name": "bench", "kind": "app", "modules": [{"id": "api", "type": "fastapi_router"}], "meta": {"x": 1}}
+    return [
+        ("GET /healthz", 1, "GET", "/healthz", lambda rnd: {}),
+        ("GET /api/settings", 2, "GET", "/api/settings", lambda rnd: {}),
+        ("POST /api/chat", 4, "POST", "/api/chat",
+         lambda rnd: {"json_body": {"messages": [{"role": "user", "content": f"hello {rnd.random()}"}]}}),
+        ("GET /api/chat/history", 3, "GET", "/api/chat/history", lambda rnd: {"params": {"limit": 50}}),
+        ("GET /api/learn/items?q", 2, "GET", "/api/learn/items", lambda rnd: {"params": {"q": "steel", "limit": 50}}),
+        ("GET /api/engines/spec/schema", 1, "GET", "/api/engines/spec/schema", lambda rnd: {}),
+        ("POST /api/engines/readiness/report", 2, "POST", "/api/engines/readiness/report", lambda rnd: {"json_body": {"spec": spec}}),
+        ("GET /api/engines/artifacts", 1, "GET", "/api/engines/artifacts", lambda rnd: {}),
+    ]
+
+def _setup_backend(td: str, rows: int):
+    os.environ["ATLAS_DB_PATH"] = os.path.join(td, "backend.db")
+    os.environ["ATLAS_ENGINE_ARTIFACTS_DIR"] = os.path.join(td, "engine_artifacts")
+    os.environ["ATLAS_PLUGIN_ROOT"] = os.path.join(td, "plugins_installed")
+    os.environ["ATLAS_GENERATED_PLUGINS_DIR"] = os.path.join(td, "plugins_generated")
+    os.environ.pop("EXTAPI_KEY", None)  # keep /api/chat on the stored-reply path, no network
+    from backend.app.main import app
+    _install_overlay(app)
+    _seed_backend(rows)
+    return app, _backend_scenario()
+
+TARGETS = {"pmx": _setup_pmx, "backend": _setup_backend}
+
+# --- driver ---
+
+def _percentile(sorted_ms: list[float], q: float) -> float:
+    if not sorted_ms:
+        return 0.0
+    return sorted_ms[min(len(sorted_ms) - 1, int(q * len(sorted_ms)))]
+
+async def _drive(app, scenario: Scenario, requests: int, concurrency: int, warmup: int, seed: int) -> dict:
+    client = AsgiClient(app)
+    schedule = [entry for entry in scenario for _ in range(entry[1])]
+    lat: dict[str, list[float]] = {label: [] for label, *_ in scenario}
+    errors: dict[str, int] = {label: 0 for label, *_ in scenario}
+    counter = iter(range(warmup + requests))
+
+    async def worker(wid: int):
+        rnd = random.Random(seed + wid)
+        for i in counter:
+            label, _, method, path, make = schedule[i % len(schedule)]
+            kw = make(rnd)
+            t0 = time.perf_counter()
+            status, _ = await client.request(method, kw.pop("path", path), **kw)
+            ms = (time.perf_counter() - t0) * 1000
+            if i < warmup:
+                continue
+            lat[label].append(ms)
+            if status >= 400:
+                errors[label] += 1
+
+    async with app.router.lifespan_context(app):
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(w) for w in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+
+    routes = {}
+    for label, values in lat.items():
+        values.sort()
+        routes[label] = {
+            "count": len(values), "errors": errors[label],
+            "p50_ms": round(_percentile(values, 0.50), 3),
+            "p95_ms": round(_percentile(values, 0.95), 3),
+            "p99_ms": round(_percentile(values, 0.99), 3),
+        }
+    # Requests are measured together, so per-route throughput is its share of the wall time.
+    for stats in routes.values():
+        stats["rps"] = round(stats["count"] / elapsed, 1) if elapsed else 0.0
+    return {"elapsed_s": round(elapsed, 3), "rps": round(requests / elapsed, 1) if elapsed else 0.0, "routes": routes}
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def _print_report(results: dict, baseline: dict | None) -> None:
+    for target, res in results["targets"].items():
+        print(f"\n== {target}: {res['rps']} req/s total, seed {res['seed_s']}s ==")
+        base_routes = ((baseline or {}).get("targets", {}).get(target) or {}).get("routes", {})
+        print(f"{'route':40s} {'count':>7s} {'err':>5s} {'req/s':>9s} {'p50':>8s} {'p95':>8s} {'p99':>8s}")
+        for label, s in res["routes"].items():
+            line = f"{label:40s} {s['count']:7d} {s['errors']:5d} {s['rps']:9.1f} {s['p50_ms']:8.2f} {s['p95_ms']:8.2f} {s['p99_ms']:8.2f}"
+            b = base_routes.get(label)
+            if b and b.get("p95_ms"):
+                line += f"   p95 {100 * (s['p95_ms'] - b['p95_ms']) / b['p95_ms']:+.1f}% vs {baseline['meta'].get('git_rev')}"
+            print(line)
+
+def main_cli(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--targets", default="pmx,backend")
+    ap.add_argument("--rows", type=int, default=10_000, help="dataset size (10k-1M)")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--requests", type=int, default=5_000)
+    ap.add_argument("--warmup", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default=None, help="write the results as JSON to this file")
+    ap.add_argument("--baseline", default=None, help="earlier --out file to compare against")
+    args = ap.parse_args(argv)
+
+    results: dict[str, Any] = {
+        "meta": {"git_rev": _git_rev(), "timestamp": int(time.time()), "python": platform.python_version(),
+                 "platform": platform.platform(), "rows": args.rows, "concurrency": args.concurrency,
+                 "requests": args.requests},
+        "targets": {},
+    }
+    with tempfile.TemporaryDirectory() as td:
+        for target in [t.strip() for t in args.targets.split(",") if t.strip()]:
+            t0 = time.perf_counter()
+            app, scenario = TARGETS[target](td, args.rows)
+            seed_s = round(time.perf_counter() - t0, 2)
+            res = asyncio.run(_drive(app, scenario, args.requests, args.concurrency, args.warmup, args.seed))
+            res["seed_s"] = seed_s
+            results["targets"][target] = res
+
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    _print_report(results, baseline)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nwrote {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main_cli())
@@ -1,9 +1,16 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
 from pathlib import Path
 from fastapi import HTTPException
 from fastapi.responses import FileResponse
-import json, time, zipfile, hashlib, os, uuid
+import json, re, time, zipfile, hashlib, os, uuid, threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 # Persistent exports (Render disk or docker volume)
 EXPORT_DIR = Path(os.getenv("ATLAS_EXPORT_DIR", "/data/exports"))
@@ -19,6 +26,14 @@ def spec_schema() -> dict:
         "providers": {"ocr":"external_provider","llm":"external_provider","storage":"local_volume"}
     }
 
+_SLUG = re.compile(r"[A-Za-z0-9._-]+")
+
+def artifact_name(slug) -> str:
+    # The slug becomes a file name in EXPORT_DIR, so it must be a single plain path component.
+    if not isinstance(slug, str) or not _SLUG.fullmatch(slug) or slug in (".", ".."):
+        raise HTTPException(400, "platform.slug must match [A-Za-z0-9._-]+")
+    return f"{slug}_onprem_v1.zip"
+
 def _sha256_file(p: Path) -> str:
     h = hashlib.sha256()
     with p.open("rb") as f:
@@ -26,15 +41,142 @@ def _sha256_file(p: Path) -> str:
             h.update(chunk)
     return h.hexdigest()
 
+# Checksum index: {artifact: {"size", "mtime_ns", "sha256"[, "key", "used_at"]}}. Digests are
+# stored once at export time; the listing only re-hashes zips whose (size, mtime_ns) no longer
+# match. "key" is the export cache key the artifact was built for (dropped if the file changes).
+_INDEX_PATH = EXPORT_DIR / ".exports-index.json"
+_INDEX_LOCK_PATH = EXPORT_DIR / ".exports-index.lock"
+_index_lock = threading.Lock()
+
+# Bump whenever a builder's output changes, so cached artifacts are rebuilt.
+BUILDER_VERSION = "pmx-1"
+# LRU cap on EXPORT_DIR; least recently exported or downloaded artifacts are deleted beyond it (0 = no cap).
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("ATLAS_EXPORT_CACHE_MAX_BYTES", str(2 * 1024**3)))
+TOUCH_INTERVAL_S = 60
+
+@contextmanager
+def _index_locked():
+    # The index is read-modify-written by server threads and by export job worker processes,
+    # so the thread lock is paired with an OS lock on a sidecar file.
+    with _index_lock, open(_INDEX_LOCK_PATH, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # gives up after ~10s
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _load_index() -> dict:
+    try:
+        return json.loads(_INDEX_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def _save_index(idx: dict) -> None:
+    tmp = _INDEX_PATH.with_name(f"{_INDEX_PATH.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(idx, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, _INDEX_PATH)
+
+def _record_export(p: Path, sha256: str | None = None, key: str | None = None) -> str:
+    st = p.stat()
+    sha256 = sha256 or _sha256_file(p)
+    with _index_locked():
+        idx = _load_index()
+        idx[p.name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256}
+        if key:
+            idx[p.name].update(key=key, used_at=time.time())
+        _save_index(idx)
+    return sha256
+
+def _export_key(payload: dict) -> str:
+    canonical = json.dumps({"builder": BUILDER_VERSION, "preset_id": payload.get("preset_id"), "spec": payload.get("spec")},
+                           sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def _cached_export(artifact: str, key: str) -> str | None:
+    # sha256 of the artifact if it was built for `key` and is unchanged on disk; marks it used.
+    with _index_locked():
+        idx = _load_index()
+        rec = idx.get(artifact)
+        if not rec or rec.get("key") != key:
+            return None
+        try:
+            st = (EXPORT_DIR / artifact).stat()
+        except OSError:
+            return None
+        if st.st_size != rec["size"] or st.st_mtime_ns != rec["mtime_ns"]:
+            return None
+        rec["used_at"] = time.time()
+        _save_index(idx)
+        return rec["sha256"]
+
+def _touch_export(artifact: str) -> None:
+    # A download counts as a use for the LRU. Throttled so busy artifacts don't rewrite the
+    # index on every request.
+    with _index_locked():
+        idx = _load_index()
+        rec = idx.get(artifact)
+        if rec is None or time.time() - rec.get("used_at", 0) < TOUCH_INTERVAL_S:
+            return
+        rec["used_at"] = time.time()
+        _save_index(idx)
+
+def _evict_exports(keep: str) -> list[str]:
+    # Deletes least recently used artifacts until EXPORT_DIR's zips fit in EXPORT_CACHE_MAX_BYTES.
+    if EXPORT_CACHE_MAX_BYTES <= 0:
+        return []
+    removed = []
+    with _index_locked():
+        idx = _load_index()
+        total = sum(r["size"] for r in idx.values())
+        for name, rec in sorted(idx.items(), key=lambda kv: kv[1].get("used_at", kv[1]["mtime_ns"] / 1e9)):
+            if total <= EXPORT_CACHE_MAX_BYTES:
+                break
+            if name == keep:
+                continue
+            (EXPORT_DIR / name).unlink(missing_ok=True)
+            total -= rec["size"]
+            del idx[name]
+            removed.append(name)
+        if removed:
+            _save_index(idx)
+    return removed
+
 def list_exports() -> list[dict]:
     items = []
-    for p in sorted(EXPORT_DIR.glob("*.zip"), key=lambda x: x.stat().st_mtime, reverse=True):
-        items.append({
-            "artifact": p.name,
-            "bytes": p.stat().st_size,
-            "sha256": _sha256_file(p),
-            "mtime": int(p.stat().st_mtime),
-        })
+    with _index_locked():
+        idx = _load_index()
+        seen, dirty = set(), False
+        with os.scandir(EXPORT_DIR) as it:
+            for e in it:
+                if not e.name.endswith(".zip") or not e.is_file():
+                    continue
+                st = e.stat()  # one stat per file
+                seen.add(e.name)
+                rec = idx.get(e.name)
+                if not rec or rec.get("size") != st.st_size or rec.get("mtime_ns") != st.st_mtime_ns:
+                    # New or modified outside the factory: re-hash, and it no longer matches any cache key.
+                    rec = idx[e.name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": _sha256_file(Path(e.path))}
+                    dirty = True
+                items.append({"artifact": e.name, "bytes": st.st_size, "sha256": rec["sha256"], "mtime": int(st.st_mtime)})
+        for gone in set(idx) - seen:
+            del idx[gone]
+            dirty = True
+        if dirty:
+            _save_index(idx)
+    items.sort(key=lambda x: (x["mtime"], x["artifact"]), reverse=True)
     return items
 
 # --- Presets (v4) ---
@@ -49,15 +191,12 @@ PRESETS = [
 def list_presets() -> list[dict]:
     return PRESETS
 
-def _build_pmx_package(tmpdir: Path) -> Path:
+def _pmx_package_files() -> list[tuple[str, str]]:
     # Minimal real client package (same spirit as atlas_pmx_onprem_v1.zip delivered)
-    pkg = tmpdir / "atlas_pmx_onprem_v1"
-    pkg.mkdir(parents=True, exist_ok=True)
+    files: list[tuple[str, str]] = []
 
     def w(rel: str, content: str):
-        p = pkg / rel
-        p.parent.mkdir(parents=True, exist_ok=True)
-        p.write_text(content, encoding="utf-8")
+        files.append((rel, content))
 
     # Backend
     w("backend/app/__init__.py", "")
@@ -134,15 +273,65 @@ def _build_pmx_package(tmpdir: Path) -> Path:
     w("README_DEPLOY.md", "Run: docker compose -f ops/docker-compose.yml up -d --build\n")
     w("plugins/README.md", "Drop plugins here.\n")
 
-    # Zip
-    zip_path = tmpdir / "atlas_pmx_onprem_v1.zip"
-    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as z:
-        for p in pkg.rglob("*"):
-            if p.is_file():
-                z.write(p, p.relative_to(pkg))
-    return zip_path
+    return files
+
+class _HashingWriter:
+    # Write-only sink that hashes bytes on their way to disk. No seek(), so zipfile streams
+    # members with data descriptors instead of rewinding to patch headers (one pass, hash stays valid).
+    def __init__(self, f):
+        self._f, self._pos, self.sha = f, 0, hashlib.sha256()
+
+    def write(self, b) -> int:
+        self.sha.update(b)
+        self._pos += len(b)
+        return self._f.write(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        self._f.flush()
+
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+def _write_export(artifact: str, files: list[tuple[str, str]]) -> str:
+    # Zips in-memory members straight into a temp file in EXPORT_DIR, then renames it into place.
+    tmp = EXPORT_DIR / f".{artifact}.{uuid.uuid4().hex}.tmp"
+    try:
+        with tmp.open("wb") as f:
+            out = _HashingWriter(f)
+            with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as z:
+                # Reproducible: sorted entries, fixed timestamp, fixed unix permissions.
+                for rel, content in sorted(files):
+                    info = zipfile.ZipInfo(rel, date_time=ZIP_EPOCH)
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    info.create_system = 3
+                    info.external_attr = 0o100644 << 16
+                    z.writestr(info, content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, EXPORT_DIR / artifact)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return out.sha.hexdigest()
+
+def _export(artifact: str, mode: str, key: str, build, progress=None) -> dict:
+    # Serves the existing artifact when it was already built for this key; otherwise builds it.
+    # progress(stage) is called as each stage starts (used by the async job queue).
+    step = progress or (lambda stage: None)
+    step("cache_lookup")
+    sha = _cached_export(artifact, key)
+    cached = sha is not None
+    if not cached:
+        step("build")
+        digest = _write_export(artifact, build())
+        step("index")
+        sha = _record_export(EXPORT_DIR / artifact, digest, key)
+        _evict_exports(keep=artifact)
+    return {"status":"ok","artifact":artifact,"download_url":f"/api/factory/download/{artifact}","sha256":sha,"mode":mode,"cached":cached}
 
-def export_from_payload(payload: dict) -> dict:
+def export_from_payload(payload: dict, progress=None) -> dict:
     preset_id = payload.get("preset_id")
     spec = payload.get("spec")
 
@@ -150,25 +339,12 @@ def export_from_payload(payload: dict) -> dict:
         if preset_id != "atlas_pmx_onprem_v1":
             # v4: ship PMX first; others are reserved for v5 templates
             raise HTTPException(400, "v4 supports preset atlas_pmx_onprem_v1 only (others reserved for v5 templates).")
-        import tempfile
-        with tempfile.TemporaryDirectory() as td:
-            tmp = Path(td)
-            built_zip = _build_pmx_package(tmp)
-            artifact = built_zip.name
-            target = EXPORT_DIR / artifact
-            target.write_bytes(built_zip.read_bytes())
-            return {"status":"ok","artifact":artifact,"download_url":f"/api/factory/download/{artifact}","sha256":_sha256_file(target),"mode":"preset"}
+        return _export("atlas_pmx_onprem_v1.zip", "preset", _export_key(payload), _pmx_package_files, progress)
 
     if spec and not preset_id:
         # v4: allow custom spec but map to PMX builder for now
-        import tempfile
-        with tempfile.TemporaryDirectory() as td:
-            tmp = Path(td)
-            built_zip = _build_pmx_package(tmp)
-            artifact = f"{spec.get('platform',{}).get('slug','atlas_product')}_onprem_v1.zip"
-            target = EXPORT_DIR / artifact
-            target.write_bytes(built_zip.read_bytes())
-            return {"status":"ok","artifact":artifact,"download_url":f"/api/factory/download/{artifact}","sha256":_sha256_file(target),"mode":"spec-mapped"}
+        artifact = artifact_name((spec.get("platform") or {}).get("slug", "atlas_product"))
+        return _export(artifact, "spec-mapped", _export_key(payload), _pmx_package_files, progress)
 
     raise HTTPException(400, "Provide either {preset_id} OR {spec}.")
 
@@ -176,4 +352,5 @@ def download_export(artifact: str):
     p = EXPORT_DIR / artifact
     if not p.exists():
         raise HTTPException(404, "artifact not found")
+    _touch_export(p.name)
     return FileResponse(str(p), filename=p.name, media_type="application/zip")
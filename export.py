@@ -1,24 +1,184 @@
 from fastapi import APIRouter, HTTPException
 from pathlib import Path
-import zipfile, json, tempfile, shutil, hashlib
+import hashlib, json, mmap, os, struct, sys, threading, time, uuid, zlib
+
+try:
+    from . import engine
+except ImportError:  # top-level module (python export.py build-bundles, bench)
+    import engine
 
 router = APIRouter(prefix="/api/factory", tags=["factory"])
 
-BASE = Path(__file__).resolve().parents[3]
-TEMPLATES = BASE / "templates"
+_HERE = Path(__file__).resolve()
+BASE = _HERE.parents[3] if len(_HERE.parents) > 3 else _HERE.parent
+TEMPLATES = Path(os.getenv("ATLAS_TEMPLATES_DIR", str(BASE / "templates")))
+EXPORT_DIR = engine.EXPORT_DIR  # artifacts share engine's checksum index and LRU cap
+
+# Template bundles: each template dir (core/backend, modules/<m>, deploy_profiles/<p>) is packed
+# once into <name>.<sig>.bin (raw-deflate members back to back) plus <name>.json (manifest with
+# offsets, sizes and CRCs). Exports mmap the .bin and splice members into the output zip as-is.
+BUNDLE_DIR = Path(os.getenv("ATLAS_TEMPLATE_BUNDLE_DIR", str(TEMPLATES / ".bundles")))
+BUNDLE_VERSION = 1
+# How often a loaded bundle re-checks its template dir for edits (one walk + stat per file).
+BUNDLE_RECHECK_S = float(os.getenv("ATLAS_TEMPLATE_BUNDLE_RECHECK_S", "60"))
+
+_DOS_TIME, _DOS_DATE = 0, (1 << 5) | 1  # 1980-01-01 00:00, so archives are reproducible
+_bundles: dict[str, "_Bundle"] = {}
+_bundles_lock = threading.Lock()
 
-def _hash_file(p: Path):
-    h = hashlib.sha256()
-    h.update(p.read_bytes())
+def _deflate(raw: bytes) -> bytes:
+    c = zlib.compressobj(9, zlib.DEFLATED, -15)
+    return c.compress(raw) + c.flush()
+
+def _template_dir(kind: str, name: str) -> Path | None:
+    root = (TEMPLATES / kind).resolve()
+    p = (root / name).resolve()
+    return p if p.parent == root and p.is_dir() else None
+
+def _signature(src: Path) -> str:
+    h = hashlib.sha256(f"v{BUNDLE_VERSION}".encode())
+    for p in sorted(src.rglob("*")):
+        if p.is_file():
+            st = p.stat()
+            h.update(f"{p.relative_to(src).as_posix()}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
     return h.hexdigest()
 
-def _copytree(src: Path, dst: Path):
-    for p in src.rglob("*"):
-        if p.is_dir():
-            continue
-        target = dst / p.relative_to(src)
-        target.parent.mkdir(parents=True, exist_ok=True)
-        target.write_bytes(p.read_bytes())
+class _Bundle:
+    # users/retired are guarded by _bundles_lock: a bundle replaced after a template edit is
+    # unmapped once the last export reading from it is done.
+    def __init__(self, name: str, src: Path, manifest: dict):
+        self.name, self.src, self.sig = name, src, manifest["signature"]
+        self.members: list[dict] = manifest["members"]
+        self.checked_at = time.monotonic()
+        self.users = 0
+        self.retired = False
+        with (BUNDLE_DIR / manifest["data"]).open("rb") as f:
+            # mmap can't map an empty file (template dir with no files)
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.members else b""
+
+    def member(self, m: dict):
+        return memoryview(self.data)[m["offset"]:m["offset"] + m["csize"]]
+
+    def close(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+def build_bundle(kind: str, name: str) -> dict | None:
+    # Packs one template dir; skips the work if the manifest already matches the dir's signature.
+    src = _template_dir(kind, name)
+    if src is None:
+        return None
+    bname = f"{kind}__{name}"
+    sig = _signature(src)
+    man_path = BUNDLE_DIR / f"{bname}.json"
+    try:
+        manifest = json.loads(man_path.read_text(encoding="utf-8"))
+        if manifest.get("signature") == sig and (BUNDLE_DIR / manifest["data"]).exists():
+            return manifest
+    except (OSError, ValueError, KeyError):
+        pass
+    BUNDLE_DIR.mkdir(parents=True, exist_ok=True)
+    data_name = f"{bname}.{sig[:16]}.bin"
+    members, offset = [], 0
+    tmp = BUNDLE_DIR / f".{data_name}.{uuid.uuid4().hex}.tmp"
+    with tmp.open("wb") as f:
+        for p in sorted(src.rglob("*")):
+            if not p.is_file():
+                continue
+            raw = p.read_bytes()
+            comp = _deflate(raw)
+            f.write(comp)
+            members.append({"path": p.relative_to(src).as_posix(), "offset": offset, "csize": len(comp),
+                            "size": len(raw), "crc": zlib.crc32(raw)})
+            offset += len(comp)
+    os.replace(tmp, BUNDLE_DIR / data_name)
+    manifest = {"version": BUNDLE_VERSION, "signature": sig, "data": data_name, "members": members}
+    tmp = BUNDLE_DIR / f".{bname}.{uuid.uuid4().hex}.json.tmp"
+    tmp.write_text(json.dumps(manifest), encoding="utf-8")
+    os.replace(tmp, man_path)  # manifest last: it only ever points at a complete .bin
+    for old in BUNDLE_DIR.glob(f"{bname}.*.bin"):
+        if old.name != data_name:
+            try:
+                old.unlink(missing_ok=True)  # POSIX: processes that still map it keep a valid mapping
+            except PermissionError:
+                pass  # Windows: still mapped by an export in flight; removed by a later build
+    return manifest
+
+def build_bundles() -> list[str]:
+    built = []
+    for kind in ("core", "modules", "deploy_profiles"):
+        root = TEMPLATES / kind
+        if root.is_dir():
+            for d in sorted(root.iterdir()):
+                if d.is_dir() and build_bundle(kind, d.name):
+                    built.append(f"{kind}/{d.name}")
+    return built
+
+def _retire(b: _Bundle) -> None:
+    # Called with _bundles_lock held.
+    b.retired = True
+    if b.users == 0:
+        b.close()
+
+def _release(b: _Bundle) -> None:
+    with _bundles_lock:
+        b.users -= 1
+        if b.retired and b.users == 0:
+            b.close()
+
+def _bundle(kind: str, name: str) -> _Bundle | None:
+    # Returns the current bundle with a use taken; callers hand it back with _release().
+    key = f"{kind}__{name}"
+    with _bundles_lock:
+        b = _bundles.get(key)
+        if b is None or time.monotonic() - b.checked_at >= BUNDLE_RECHECK_S:
+            src = _template_dir(kind, name)
+            if src is None:
+                if b is not None:
+                    _retire(_bundles.pop(key))
+                return None
+            if b is not None and _signature(src) == b.sig:
+                b.checked_at = time.monotonic()
+            else:
+                if b is not None:
+                    _retire(_bundles.pop(key))  # unmapped first, so its .bin can be deleted on Windows
+                b = _bundles[key] = _Bundle(key, src, build_bundle(kind, name))
+        b.users += 1
+        return b
+
+class _ZipSplicer:
+    # Minimal zip writer for members that are already raw-deflated (no recompression). Hashes
+    # the archive as it is written. Fixed timestamps and 0644 permissions.
+    def __init__(self, f):
+        self.f, self.pos, self.sha, self.central = f, 0, hashlib.sha256(), []
+
+    def _write(self, b) -> None:
+        self.f.write(b)
+        self.sha.update(b)
+        self.pos += len(b)
+
+    def add_deflated(self, name: str, comp, size: int, crc: int) -> None:
+        if len(comp) >= 0xFFFFFFFF or size >= 0xFFFFFFFF:
+            raise ValueError(f"{name}: member too large (zip64 not supported)")
+        nb = name.encode("utf-8")
+        flags = 0 if name.isascii() else 0x800
+        self.central.append((nb, flags, crc, len(comp), size, self.pos))
+        self._write(struct.pack("<4s5H3L2H", b"PK\x03\x04", 20, flags, 8, _DOS_TIME, _DOS_DATE,
+                                crc, len(comp), size, len(nb), 0) + nb)
+        self._write(comp)
+
+    def add_bytes(self, name: str, raw: bytes) -> None:
+        self.add_deflated(name, _deflate(raw), len(raw), zlib.crc32(raw))
+
+    def close(self) -> None:
+        if len(self.central) >= 0xFFFF or self.pos >= 0xFFFFFFFF:
+            raise ValueError("archive too large (zip64 not supported)")
+        start = self.pos
+        for nb, flags, crc, csize, size, offset in self.central:
+            self._write(struct.pack("<4s6H3L5H2L", b"PK\x01\x02", (3 << 8) | 20, 20, flags, 8, _DOS_TIME, _DOS_DATE,
+                                    crc, csize, size, len(nb), 0, 0, 0, 0, 0o100644 << 16, offset) + nb)
+        n = len(self.central)
+        self._write(struct.pack("<4s4H2LH", b"PK\x05\x06", 0, 0, n, n, self.pos - start, start, 0))
 
 @router.post("/export")
 def export_platform(spec: dict):
@@ -29,35 +189,57 @@ def export_platform(spec: dict):
         deploy = spec.get("deploy", {})
     except Exception as e:
         raise HTTPException(400, f"Invalid spec: {e}")
+    if not isinstance(platform, dict):
+        raise HTTPException(400, "Invalid spec: platform must be an object")
+    artifact = engine.artifact_name(platform.get("slug", "atlas_platform"))
 
-    with tempfile.TemporaryDirectory() as td:
-        out = Path(td) / f"{platform.get('slug','atlas_platform')}_onprem_v1"
-        out.mkdir(parents=True, exist_ok=True)
+    # output path -> (bundle, member) or raw bytes; later sources win, as with the old copy-over
+    members: dict[str, object] = {}
+    used: list[_Bundle] = []
+    profile = deploy.get("profile", "onprem_dockercompose")
+    sources = [("backend", "core", "backend"), ("frontend", "core", "frontend")]
+    sources += [(f"backend/modules/{m}", "modules", m) for m in modules]
+    sources += [("ops", "deploy_profiles", profile)]
+    # Zip: members go straight from the mmapped bundles into a temp file, then atomic rename
+    tmp = EXPORT_DIR / f".{artifact}.{uuid.uuid4().hex}.tmp"
+    try:
+        for prefix, kind, name in sources:
+            b = _bundle(kind, str(name))
+            if b is not None:
+                used.append(b)
+                for m in b.members:
+                    members[f"{prefix}/{m['path']}"] = (b, m)
 
-        # Core
-        _copytree(TEMPLATES / "core" / "backend", out / "backend")
-        _copytree(TEMPLATES / "core" / "frontend", out / "frontend")
+        # Write README and env example
+        members["README_DEPLOY.md"] = b"Run: docker compose up -d\n"
+        members[".env.example"] = b"JWT_SECRET=change_me\nOCR_API_KEY=change_me\n"
 
-        # Modules
-        for m in modules:
-            mod = TEMPLATES / "modules" / m
-            if mod.exists():
-                _copytree(mod, out / "backend" / "modules" / m)
+        EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+        with tmp.open("wb") as f:
+            z = _ZipSplicer(f)
+            for path in sorted(members):
+                src = members[path]
+                if isinstance(src, bytes):
+                    z.add_bytes(path, src)
+                else:
+                    b, m = src
+                    z.add_deflated(path, b.member(m), m["size"], m["crc"])
+            z.close()
+        os.replace(tmp, EXPORT_DIR / artifact)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    finally:
+        for b in used:
+            _release(b)
 
-        # Deploy profile
-        profile = deploy.get("profile", "onprem_dockercompose")
-        _copytree(TEMPLATES / "deploy_profiles" / profile, out / "ops")
+    checksum = engine._record_export(EXPORT_DIR / artifact, z.sha.hexdigest())
+    engine._evict_exports(keep=artifact)
+    return {"status":"ok","artifact":artifact,"checksum":checksum}
 
-        # Write README and env example
-        (out / "README_DEPLOY.md").write_text("Run: docker compose up -d\n", encoding="utf-8")
-        (out / ".env.example").write_text("JWT_SECRET=change_me\nOCR_API_KEY=change_me\n", encoding="utf-8")
-
-        # Zip
-        zip_path = Path(td) / f"{out.name}.zip"
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as z:
-            for p in out.rglob("*"):
-                if p.is_file():
-                    z.write(p, p.relative_to(out))
-
-        checksum = _hash_file(zip_path)
-        return {"status":"ok","artifact":zip_path.name,"checksum":checksum}
\ No newline at end of file
+if __name__ == "__main__":
+    # Build-time packing: python export.py build-bundles
+    if sys.argv[1:] == ["build-bundles"]:
+        print("\n".join(build_bundles()))
+    else:
+        raise SystemExit("usage: python export.py build-bundles")
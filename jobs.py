@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from fastapi import HTTPException
+import functools, json, logging, multiprocessing, os, sqlite3, threading, time, uuid
+
+from . import engine
+
+# Async export jobs: rows in SQLite (so they survive restarts), builds in a bounded process pool.
+JOBS_DB = Path(os.getenv("ATLAS_EXPORT_JOBS_DB", str(engine.EXPORT_DIR / "jobs.db")))
+WORKERS = int(os.getenv("ATLAS_EXPORT_WORKERS", "2"))
+# Workers heartbeat every HEARTBEAT_S while building; a "running" job silent for STALE_S, or
+# owned by a server that is no longer alive, is re-queued by the sweep (every SWEEP_S).
+HEARTBEAT_S = float(os.getenv("ATLAS_EXPORT_JOB_HEARTBEAT_S", "10"))
+STALE_S = float(os.getenv("ATLAS_EXPORT_JOB_STALE_S", "60"))
+SWEEP_S = float(os.getenv("ATLAS_EXPORT_JOB_SWEEP_S", "30"))
+# A queued job caught in a crashed pool is moved to a fresh pool at most this many times.
+MAX_REDISPATCH = 3
+
+log = logging.getLogger("atlas.factory.jobs")
+
+_lock = threading.Lock()
+_pool: ProcessPoolExecutor | None = None
+_ready = False
+_stopped = False
+# This server's boot id: owner of the jobs it dispatches. A fresh one per resume(), so jobs
+# from before a restart never look like they belong to a live server.
+_server_id = uuid.uuid4().hex
+_sweeper: threading.Thread | None = None
+_sweep_stop = threading.Event()
+
+def _db() -> sqlite3.Connection:
+    con = sqlite3.connect(JOBS_DB, timeout=30)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA busy_timeout=30000")
+    return con
+
+def _init() -> None:
+    global _ready
+    if _ready:
+        return
+    con = _db()
+    try:
+        con.execute("""CREATE TABLE IF NOT EXISTS export_jobs(
+            id TEXT PRIMARY KEY, status TEXT NOT NULL, payload_json TEXT NOT NULL,
+            stages_json TEXT NOT NULL DEFAULT '[]', result_json TEXT, error TEXT,
+            created_at REAL NOT NULL, started_at REAL, finished_at REAL, heartbeat_at REAL)""")
+        con.execute("CREATE INDEX IF NOT EXISTS idx_export_jobs_status ON export_jobs(status, created_at)")
+        cols = {r[1] for r in con.execute("PRAGMA table_info(export_jobs)")}
+        for col in ("owner", "run_id"):
+            if col not in cols:
+                con.execute(f"ALTER TABLE export_jobs ADD COLUMN {col} TEXT")
+        con.execute("CREATE TABLE IF NOT EXISTS export_servers(id TEXT PRIMARY KEY, heartbeat_at REAL NOT NULL)")
+        con.commit()
+    finally:
+        con.close()
+    _ready = True
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            # spawn: forking a server process with live threads/event loop isn't safe.
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def _discard(pool: ProcessPoolExecutor) -> None:
+    # A dead worker leaves the executor permanently broken; the next _executor() builds a new one.
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _dispatch(job_id: str, attempt: int = 0) -> None:
+    for _ in range(2):
+        pool = _executor()
+        try:
+            fut = pool.submit(run_job, job_id, _server_id)
+        except BrokenProcessPool:
+            _discard(pool)
+            continue
+        fut.add_done_callback(functools.partial(_job_done, job_id, pool, attempt))
+        return
+    raise BrokenProcessPool("export worker pool could not be restarted")
+
+def _job_done(job_id: str, pool: ProcessPoolExecutor, attempt: int, fut: Future) -> None:
+    # run_job records its own outcome; this only handles the worker process dying under it.
+    # The job it was building is marked as failed (re-running an OOM build would just crash
+    # again); jobs that were still queued in the broken pool go to a fresh one.
+    if fut.cancelled() or fut.exception() is None or _stopped:
+        return
+    exc = fut.exception()
+    if isinstance(exc, BrokenProcessPool):
+        _discard(pool)
+    statuses = ("running",) if attempt < MAX_REDISPATCH else ("running", "queued")
+    if _fail(job_id, f"export worker died: {type(exc).__name__}: {exc}", statuses, owner=_server_id) == "queued":
+        try:
+            _dispatch(job_id, attempt + 1)
+        except Exception:
+            log.exception("could not resubmit export job %s; it stays queued until resume()", job_id)
+
+def _fail(job_id: str, error: str, statuses: tuple[str, ...] = ("queued", "running"),
+          owner: str | None = None) -> str | None:
+    # Marks the job failed if it is in one of `statuses` (and, given `owner`, not claimed by
+    # another server since); returns its status afterwards.
+    con = _db()
+    try:
+        with con:
+            con.execute(f"UPDATE export_jobs SET status='error', error=?, finished_at=? "
+                        f"WHERE id=? AND status IN ({','.join('?' * len(statuses))}) "
+                        f"AND (? IS NULL OR owner IS NULL OR owner=?)",
+                        (error[:2000], time.time(), job_id, *statuses, owner, owner))
+        row = con.execute("SELECT status FROM export_jobs WHERE id=?", (job_id,)).fetchone()
+    finally:
+        con.close()
+    return row[0] if row else None
+
+def _heartbeat(job_id: str, run_id: str, stop: threading.Event) -> None:
+    # Keeps heartbeat_at fresh during long, silent stages so the sweep doesn't re-queue a live job.
+    con = _db()
+    try:
+        while not stop.wait(HEARTBEAT_S):
+            with con:
+                con.execute("UPDATE export_jobs SET heartbeat_at=? WHERE id=? AND run_id=?", (time.time(), job_id, run_id))
+    except sqlite3.Error:
+        log.warning("heartbeat for export job %s stopped", job_id, exc_info=True)
+    finally:
+        con.close()
+
+def run_job(job_id: str, owner: str | None = None) -> None:
+    # Runs in a pool process. The conditional UPDATE claims the job, so a job handed out twice
+    # (e.g. resumed by two server processes) is only built once. Writes are tied to this
+    # claim's run_id: if the job was re-queued meanwhile, a late worker can't overwrite it.
+    con = _db()
+    stop = threading.Event()
+    try:
+        now = time.time()
+        run_id = uuid.uuid4().hex
+        with con:
+            claimed = con.execute(
+                "UPDATE export_jobs SET status='running', started_at=?, heartbeat_at=?, owner=?, run_id=? "
+                "WHERE id=? AND status='queued'", (now, now, owner, run_id, job_id)).rowcount
+        if not claimed:
+            return
+        threading.Thread(target=_heartbeat, args=(job_id, run_id, stop), name="export-heartbeat", daemon=True).start()
+        payload = json.loads(con.execute("SELECT payload_json FROM export_jobs WHERE id=?", (job_id,)).fetchone()[0])
+        stages: list[dict] = []
+
+        def progress(stage: str | None) -> None:
+            t = time.time()
+            if stages and "ms" not in stages[-1]:
+                stages[-1]["ms"] = round((t - stages[-1]["started_at"]) * 1000, 2)
+                stages[-1]["status"] = "done"
+            if stage:
+                stages.append({"stage": stage, "status": "running", "started_at": t})
+            with con:
+                con.execute("UPDATE export_jobs SET stages_json=?, heartbeat_at=? WHERE id=? AND run_id=?",
+                            (json.dumps(stages), t, job_id, run_id))
+
+        status, result, error = "done", None, None
+        try:
+            result = engine.export_from_payload(payload, progress=progress)
+        except HTTPException as e:
+            status, error = "error", str(e.detail)
+        except Exception as e:
+            status, error = "error", f"{type(e).__name__}: {e}"[:2000]
+        if stages and status == "error":
+            stages[-1]["status"] = "error"
+        progress(None)
+        with con:
+            con.execute("UPDATE export_jobs SET status=?, result_json=?, error=?, finished_at=? WHERE id=? AND run_id=?",
+                        (status, json.dumps(result) if result else None, error, time.time(), job_id, run_id))
+    finally:
+        stop.set()
+        con.close()
+
+def submit(payload: dict) -> dict:
+    global _stopped
+    _init()
+    _stopped = False
+    job_id = uuid.uuid4().hex
+    con = _db()
+    try:
+        with con:
+            con.execute("INSERT INTO export_jobs(id,status,payload_json,created_at) VALUES (?,?,?,?)",
+                        (job_id, "queued", json.dumps(payload), time.time()))
+    finally:
+        con.close()
+    try:
+        _dispatch(job_id)
+    except BrokenProcessPool as e:
+        _fail(job_id, str(e))
+        raise HTTPException(503, "export workers unavailable") from e
+    return get(job_id)
+
+def get(job_id: str) -> dict | None:
+    _init()
+    con = _db()
+    try:
+        row = con.execute("SELECT * FROM export_jobs WHERE id=?", (job_id,)).fetchone()
+    finally:
+        con.close()
+    if row is None:
+        return None
+    created, started, finished = row["created_at"], row["started_at"], row["finished_at"]
+    result = json.loads(row["result_json"]) if row["result_json"] else None
+    return {
+        "job_id": row["id"],
+        "status": row["status"],
+        "stages": json.loads(row["stages_json"]),
+        "timings_ms": {
+            "queued": round(((started or time.time()) - created) * 1000, 2),
+            "run": round(((finished or time.time()) - started) * 1000, 2) if started else None,
+        },
+        "result": result,
+        "download_url": result.get("download_url") if result else None,
+        "error": row["error"],
+    }
+
+def _requeue_orphans(con: sqlite3.Connection, server_id: str) -> list[str]:
+    # Re-queues running jobs whose owner isn't a live server or whose worker went silent, and
+    # returns them. Marks this server alive first.
+    now = time.time()
+    con.isolation_level = None
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        con.execute("INSERT INTO export_servers(id, heartbeat_at) VALUES (?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET heartbeat_at=excluded.heartbeat_at", (server_id, now))
+        con.execute("DELETE FROM export_servers WHERE heartbeat_at < ?", (now - 3 * SWEEP_S,))
+        ids = [r[0] for r in con.execute(
+            "SELECT id FROM export_jobs WHERE status='running' AND "
+            "(heartbeat_at < ? OR owner IS NULL OR owner NOT IN (SELECT id FROM export_servers))", (now - STALE_S,))]
+        con.executemany("UPDATE export_jobs SET status='queued', run_id=NULL WHERE id=?", [(i,) for i in ids])
+        con.execute("COMMIT")
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+    return ids
+
+def _sweep_loop() -> None:
+    while not _sweep_stop.wait(SWEEP_S):
+        try:
+            con = _db()
+            try:
+                ids = _requeue_orphans(con, _server_id)
+            finally:
+                con.close()
+            for job_id in ids:
+                log.warning("re-queuing orphaned export job %s", job_id)
+                _dispatch(job_id)
+        except Exception:
+            log.exception("export job sweep failed")
+
+def resume() -> int:
+    # Registers this server, re-queues jobs orphaned by a dead or restarted server, resubmits
+    # everything queued and starts the periodic sweep.
+    global _stopped, _server_id, _sweeper
+    _init()
+    _stopped = False
+    _server_id = uuid.uuid4().hex
+    con = _db()
+    try:
+        _requeue_orphans(con, _server_id)
+        ids = [r[0] for r in con.execute("SELECT id FROM export_jobs WHERE status='queued' ORDER BY created_at")]
+    finally:
+        con.close()
+    for job_id in ids:
+        _dispatch(job_id)
+    _sweep_stop.clear()
+    if _sweeper is None or not _sweeper.is_alive():
+        _sweeper = threading.Thread(target=_sweep_loop, name="export-job-sweep", daemon=True)
+        _sweeper.start()
+    return len(ids)
+
+def shutdown() -> None:
+    # Unfinished jobs stay queued in SQLite and are picked up again by resume(). Jobs this server
+    # was building are handed back too: a worker still finishing one can no longer write to it.
+    global _pool, _stopped
+    with _lock:
+        pool, _pool, _stopped = _pool, None, True
+    _sweep_stop.set()
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+    if not _ready:
+        return
+    con = _db()
+    try:
+        with con:
+            con.execute("UPDATE export_jobs SET status='queued', run_id=NULL WHERE status='running' AND owner=?", (_server_id,))
+            con.execute("DELETE FROM export_servers WHERE id=?", (_server_id,))
+    finally:
+        con.close()
@@ -1,33 +1,254 @@
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
-import os, sqlite3, uuid, time, json
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from typing import Optional, List, Dict, Any, Iterator
+from collections import OrderedDict
+from contextlib import contextmanager
+from email.utils import formatdate
+from urllib.parse import quote
+import os, sqlite3, uuid, time, json, threading, hashlib, tempfile, queue, logging, mimetypes
+import anyio
+import multipart
+from multipart.multipart import parse_options_header
 
 APP_NAME = os.getenv("ATLAS_PRODUCT_NAME", "Atlas PMX — Project Management eXported Platform")
 DB_PATH = os.getenv("ATLAS_DB_PATH", "/data/app.db")
 UPLOAD_DIR = os.getenv("ATLAS_UPLOAD_DIR", "/data/uploads")
 JWT_SECRET = os.getenv("JWT_SECRET", "change_me")
+DB_BUSY_TIMEOUT_MS = int(os.getenv("ATLAS_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_STATEMENT_CACHE = int(os.getenv("ATLAS_DB_STATEMENT_CACHE", "256"))
+PAGE_LIMIT_DEFAULT = int(os.getenv("ATLAS_PAGE_LIMIT", "100"))
+PAGE_LIMIT_MAX = int(os.getenv("ATLAS_PAGE_LIMIT_MAX", "1000"))
+NDJSON = "application/x-ndjson"
+BULK_CHUNK_ROWS = int(os.getenv("ATLAS_BULK_CHUNK_ROWS", "1000"))
+CHAT_FLUSH_MS = int(os.getenv("ATLAS_CHAT_FLUSH_MS", "50"))
+CHAT_BATCH_MAX = int(os.getenv("ATLAS_CHAT_BATCH_MAX", "500"))
+CHAT_QUEUE_MAX = int(os.getenv("ATLAS_CHAT_QUEUE_MAX", "10000"))
+
+log = logging.getLogger("atlas.pmx")
+UPLOAD_MAX_BYTES = int(os.getenv("ATLAS_UPLOAD_MAX_BYTES", str(2 * 1024 ** 3)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("ATLAS_UPLOAD_CHUNK_BYTES", str(1024 ** 2)))
+# Allowance for boundaries and part headers when rejecting on Content-Length alone.
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+# Content-addressed blobs: <UPLOAD_DIR>/blobs/<sha[:2]>/<sha>; temp files live alongside so rename is atomic.
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+UPLOAD_TMP_DIR = os.path.join(UPLOAD_DIR, ".tmp")
 
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+os.makedirs(BLOB_DIR, exist_ok=True)
+os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+
+class ConnectionPool:
+    # One long-lived connection per worker thread instead of connect/close per request.
+    # Connections of threads that have exited are reaped (or adopted if the ident is reused).
+    def __init__(self, path: str, busy_timeout_ms: int = 5000, cached_statements: int = 256):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._lock = threading.Lock()
+        self._conns: Dict[int, sqlite3.Connection] = {}
+
+    def _open(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000,
+                              check_same_thread=False, cached_statements=self.cached_statements)
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    def _reap(self) -> None:
+        alive = {t.ident for t in threading.enumerate()}
+        for ident in [i for i in self._conns if i not in alive]:
+            self._conns.pop(ident).close()
+
+    def acquire(self) -> sqlite3.Connection:
+        ident = threading.get_ident()
+        con = self._conns.get(ident)
+        if con is None:
+            con = self._open()
+            with self._lock:
+                self._reap()
+                self._conns[ident] = con
+        return con
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        con = self.acquire()
+        try:
+            yield con
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        # Dedicated connection for long-lived cursors (streaming) that may hop between threads.
+        con = self._open()
+        try:
+            yield con
+        finally:
+            con.close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            for con in self._conns.values():
+                con.close()
+            self._conns.clear()
+
+pool = ConnectionPool(DB_PATH, DB_BUSY_TIMEOUT_MS, DB_STATEMENT_CACHE)
 
 def db():
-    con = sqlite3.connect(DB_PATH)
-    con.row_factory = sqlite3.Row
-    return con
+    return pool.connection()
+
+def _ensure_column(cur, table: str, column: str, decl: str):
+    cols = {r[1] for r in cur.execute(f"PRAGMA table_info({table})")}
+    if column not in cols:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+PROJECT_STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS project_stats(project_id TEXT PRIMARY KEY, task_count INTEGER NOT NULL DEFAULT 0,
+    file_count INTEGER NOT NULL DEFAULT 0, file_bytes INTEGER NOT NULL DEFAULT 0, last_activity INTEGER);
+CREATE TABLE IF NOT EXISTS project_task_counts(project_id TEXT NOT NULL, status TEXT NOT NULL, n INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY(project_id, status));
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_task_ins AFTER INSERT ON tasks BEGIN
+    INSERT OR IGNORE INTO project_stats(project_id) VALUES(NEW.project_id);
+    UPDATE project_stats SET task_count=task_count+1, last_activity=MAX(COALESCE(last_activity,0), COALESCE(NEW.created_at,0)) WHERE project_id=NEW.project_id;
+    INSERT OR IGNORE INTO project_task_counts(project_id, status) VALUES(NEW.project_id, COALESCE(NEW.status,''));
+    UPDATE project_task_counts SET n=n+1 WHERE project_id=NEW.project_id AND status=COALESCE(NEW.status,'');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_stats_task_del AFTER DELETE ON tasks BEGIN
+    UPDATE project_stats SET task_count=task_count-1, last_activity=CAST(strftime('%s','now') AS INTEGER) WHERE project_id=OLD.project_id;
+    UPDATE project_task_counts SET n=n-1 WHERE project_id=OLD.project_id AND status=COALESCE(OLD.status,'');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_stats_task_upd AFTER UPDATE ON tasks BEGIN
+    UPDATE project_stats SET task_count=task_count-1 WHERE project_id=OLD.project_id;
+    UPDATE project_task_counts SET n=n-1 WHERE project_id=OLD.project_id AND status=COALESCE(OLD.status,'');
+    INSERT OR IGNORE INTO project_stats(project_id) VALUES(NEW.project_id);
+    UPDATE project_stats SET task_count=task_count+1, last_activity=CAST(strftime('%s','now') AS INTEGER) WHERE project_id=NEW.project_id;
+    INSERT OR IGNORE INTO project_task_counts(project_id, status) VALUES(NEW.project_id, COALESCE(NEW.status,''));
+    UPDATE project_task_counts SET n=n+1 WHERE project_id=NEW.project_id AND status=COALESCE(NEW.status,'');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_file_ins AFTER INSERT ON files BEGIN
+    INSERT OR IGNORE INTO project_stats(project_id) VALUES(NEW.project_id);
+    UPDATE project_stats SET file_count=file_count+1, file_bytes=file_bytes+COALESCE(NEW.size,0),
+        last_activity=MAX(COALESCE(last_activity,0), COALESCE(NEW.created_at,0)) WHERE project_id=NEW.project_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_stats_file_del AFTER DELETE ON files BEGIN
+    UPDATE project_stats SET file_count=file_count-1, file_bytes=file_bytes-COALESCE(OLD.size,0),
+        last_activity=CAST(strftime('%s','now') AS INTEGER) WHERE project_id=OLD.project_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_stats_file_upd AFTER UPDATE OF project_id, size ON files BEGIN
+    UPDATE project_stats SET file_count=file_count-1, file_bytes=file_bytes-COALESCE(OLD.size,0) WHERE project_id=OLD.project_id;
+    INSERT OR IGNORE INTO project_stats(project_id) VALUES(NEW.project_id);
+    UPDATE project_stats SET file_count=file_count+1, file_bytes=file_bytes+COALESCE(NEW.size,0),
+        last_activity=CAST(strftime('%s','now') AS INTEGER) WHERE project_id=NEW.project_id;
+END;
+"""
+
+def rebuild_project_stats(con: sqlite3.Connection) -> None:
+    # Recompute the rollups from scratch (first run on an existing database, or repair).
+    con.execute("DELETE FROM project_stats")
+    con.execute("DELETE FROM project_task_counts")
+    con.execute("""INSERT INTO project_task_counts(project_id, status, n)
+        SELECT project_id, COALESCE(status,''), COUNT(*) FROM tasks GROUP BY project_id, COALESCE(status,'')""")
+    con.execute("""INSERT INTO project_stats(project_id, task_count, file_count, file_bytes, last_activity)
+        SELECT project_id, SUM(t), SUM(f), SUM(b), MAX(ts) FROM (
+            SELECT project_id, 1 AS t, 0 AS f, 0 AS b, created_at AS ts FROM tasks
+            UNION ALL
+            SELECT project_id, 0, 1, COALESCE(size,0), created_at FROM files
+        ) GROUP BY project_id""")
+
+# Full-text search: one FTS5 table over tasks.title, files.filename and chat_logs.content.
+# search_docs maps each FTS rowid (a stable INTEGER PRIMARY KEY) to its source row.
+SEARCH_SOURCES = {"task": ("tasks", "title"), "file": ("files", "filename"), "chat": ("chat_logs", "content")}
+
+def _search_schema() -> str:
+    parts = ["""
+CREATE TABLE IF NOT EXISTS search_docs(rowid INTEGER PRIMARY KEY, kind TEXT NOT NULL, ref_id TEXT NOT NULL,
+    project_id TEXT, created_at INTEGER, UNIQUE(kind, ref_id));
+CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(body, tokenize='unicode61 remove_diacritics 2');
+"""]
+    for kind, (table, col) in SEARCH_SOURCES.items():
+        doc = f"(SELECT rowid FROM search_docs WHERE kind='{kind}' AND ref_id={{0}}.id)"
+        parts.append(f"""
+CREATE TRIGGER IF NOT EXISTS trg_search_{table}_ins AFTER INSERT ON {table} BEGIN
+    INSERT OR IGNORE INTO search_docs(kind, ref_id, project_id, created_at) VALUES('{kind}', NEW.id, NEW.project_id, NEW.created_at);
+    INSERT INTO search_fts(rowid, body) VALUES({doc.format("NEW")}, COALESCE(NEW.{col},''));
+END;
+CREATE TRIGGER IF NOT EXISTS trg_search_{table}_del AFTER DELETE ON {table} BEGIN
+    DELETE FROM search_fts WHERE rowid={doc.format("OLD")};
+    DELETE FROM search_docs WHERE kind='{kind}' AND ref_id=OLD.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_search_{table}_upd AFTER UPDATE OF {col}, project_id ON {table} BEGIN
+    UPDATE search_docs SET project_id=NEW.project_id WHERE kind='{kind}' AND ref_id=NEW.id;
+    UPDATE search_fts SET body=COALESCE(NEW.{col},'') WHERE rowid={doc.format("NEW")};
+END;
+""")
+    return "".join(parts)
+
+SEARCH_SCHEMA = _search_schema()
+
+def rebuild_search_index(con: sqlite3.Connection) -> int:
+    # One-shot (re)index of existing rows; the triggers keep it current afterwards.
+    con.execute("DELETE FROM search_fts")
+    con.execute("DELETE FROM search_docs")
+    for kind, (table, col) in SEARCH_SOURCES.items():
+        con.execute(f"INSERT INTO search_docs(kind, ref_id, project_id, created_at) SELECT ?, id, project_id, created_at FROM {table}", (kind,))
+        con.execute(f"""INSERT INTO search_fts(rowid, body)
+            SELECT d.rowid, COALESCE(t.{col},'') FROM search_docs d JOIN {table} t ON t.id=d.ref_id WHERE d.kind=?""", (kind,))
+    con.execute("INSERT INTO search_fts(search_fts) VALUES('optimize')")
+    return con.execute("SELECT COUNT(*) FROM search_docs").fetchone()[0]
+
+def _table_exists(cur, name: str) -> bool:
+    return cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone() is not None
+
+# Bump whenever the DDL in init_db() changes; unchanged databases skip schema work at startup.
+SCHEMA_VERSION = 1
 
 def init_db():
-    con = db()
-    cur = con.cursor()
-    cur.execute("CREATE TABLE IF NOT EXISTS projects(id TEXT PRIMARY KEY, name TEXT, description TEXT, created_at INTEGER)")
-    cur.execute("CREATE TABLE IF NOT EXISTS tasks(id TEXT PRIMARY KEY, project_id TEXT, title TEXT, status TEXT, due_date TEXT, created_at INTEGER)")
-    cur.execute("CREATE TABLE IF NOT EXISTS files(id TEXT PRIMARY KEY, project_id TEXT, filename TEXT, path TEXT, mime TEXT, size INTEGER, created_at INTEGER)")
-    cur.execute("CREATE TABLE IF NOT EXISTS chat_logs(id TEXT PRIMARY KEY, project_id TEXT, role TEXT, content TEXT, created_at INTEGER)")
-    cur.execute("CREATE TABLE IF NOT EXISTS users(id TEXT PRIMARY KEY, email TEXT UNIQUE, name TEXT, role TEXT, created_at INTEGER)")
-    con.commit()
-    con.close()
+    with db() as con:
+        if con.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            return
+        cur = con.cursor()
+        cur.execute("CREATE TABLE IF NOT EXISTS projects(id TEXT PRIMARY KEY, name TEXT, description TEXT, created_at INTEGER)")
+        cur.execute("CREATE TABLE IF NOT EXISTS tasks(id TEXT PRIMARY KEY, project_id TEXT, title TEXT, status TEXT, due_date TEXT, created_at INTEGER)")
+        cur.execute("CREATE TABLE IF NOT EXISTS files(id TEXT PRIMARY KEY, project_id TEXT, filename TEXT, path TEXT, mime TEXT, size INTEGER, created_at INTEGER)")
+        cur.execute("CREATE TABLE IF NOT EXISTS chat_logs(id TEXT PRIMARY KEY, project_id TEXT, role TEXT, content TEXT, created_at INTEGER)")
+        cur.execute("CREATE TABLE IF NOT EXISTS users(id TEXT PRIMARY KEY, email TEXT UNIQUE, name TEXT, role TEXT, created_at INTEGER)")
+        # Upload dedup: files.sha256 points at a shared blob; blobs.refcount counts the files rows using it.
+        _ensure_column(cur, "files", "sha256", "TEXT")
+        cur.execute("CREATE TABLE IF NOT EXISTS blobs(sha256 TEXT PRIMARY KEY, path TEXT, size INTEGER, refcount INTEGER NOT NULL DEFAULT 0, created_at INTEGER)")
+        cur.execute("""CREATE TRIGGER IF NOT EXISTS trg_files_blob_ref AFTER INSERT ON files WHEN NEW.sha256 IS NOT NULL BEGIN
+            INSERT OR IGNORE INTO blobs(sha256,path,size,refcount,created_at) VALUES(NEW.sha256,NEW.path,NEW.size,0,NEW.created_at);
+            UPDATE blobs SET refcount=refcount+1 WHERE sha256=NEW.sha256;
+        END""")
+        cur.execute("""CREATE TRIGGER IF NOT EXISTS trg_files_blob_unref AFTER DELETE ON files WHEN OLD.sha256 IS NOT NULL BEGIN
+            UPDATE blobs SET refcount=refcount-1 WHERE sha256=OLD.sha256;
+        END""")
+        # Chat dedup: one row per (project, role+content hash); legacy rows keep a NULL hash.
+        _ensure_column(cur, "chat_logs", "content_hash", "TEXT")
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_logs_project_hash ON chat_logs(project_id, content_hash)")
+        # Dashboard rollups kept current by triggers; backfilled once when first created.
+        fresh_stats = not _table_exists(cur, "project_stats")
+        cur.executescript(PROJECT_STATS_SCHEMA)
+        if fresh_stats:
+            rebuild_project_stats(con)
+        cur.executescript(SEARCH_SCHEMA)
+        # Keyset pagination indexes: ORDER BY created_at DESC, id DESC [WHERE project_id=?]
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_projects_created ON projects(created_at, id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks(created_at, id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_project_created ON tasks(project_id, created_at, id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_files_created ON files(created_at, id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_files_project_created ON files(project_id, created_at, id)")
+        cur.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
 
 init_db()
 
@@ -65,90 +286,580 @@ def require_role(min_role: str = "viewer"):
         return True
     return _dep
 
+def _parse_after(after: Optional[str]):
+    # Cursor format: "<created_at>,<id>" (the next_after value of the previous page)
+    if not after:
+        return None
+    ts, sep, rid = after.partition(",")
+    try:
+        if not sep or not rid:
+            raise ValueError(after)
+        return int(ts), rid
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor. Expected after=<created_at>,<id>.")
+
+def _keyset_query(table: str, project_id: Optional[str], after: Optional[str], limit: Optional[int]):
+    where, params = [], []
+    if project_id:
+        where.append("project_id=?")
+        params.append(project_id)
+    cursor = _parse_after(after)
+    if cursor:
+        where.append("(created_at, id) < (?, ?)")
+        params.extend(cursor)
+    sql = f"SELECT * FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created_at DESC, id DESC"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+def _listing(table: str, project_id: Optional[str], after: Optional[str], limit: Optional[int],
+             fmt: Optional[str], accept: Optional[str], row=dict):
+    if fmt == "ndjson" or NDJSON in (accept or ""):
+        # Stream straight from the cursor; limit is optional here (None = until exhausted).
+        sql, params = _keyset_query(table, project_id, after, limit)
+        def gen():
+            with pool.reader() as con:
+                cur = con.execute(sql, params)
+                while True:
+                    rows = cur.fetchmany(500)
+                    if not rows:
+                        break
+                    yield "".join(json.dumps(row(r), ensure_ascii=False) + "\n" for r in rows)
+        return StreamingResponse(gen(), media_type=NDJSON)
+
+    limit = max(1, min(limit or PAGE_LIMIT_DEFAULT, PAGE_LIMIT_MAX))
+    sql, params = _keyset_query(table, project_id, after, limit)
+    with db() as con:
+        rows = con.execute(sql, params).fetchall()
+    next_after = f"{rows[-1]['created_at']},{rows[-1]['id']}" if len(rows) == limit else None
+    return {"items": [row(r) for r in rows], "next_after": next_after}
+
+def _file_row(r) -> dict:
+    it = dict(r)
+    # Do not expose absolute path by default
+    it["path"] = None
+    return it
+
 @app.get("/healthz")
 def healthz():
     return {"ok": True, "product": APP_NAME}
 
 @app.get("/api/projects")
-def list_projects():
-    con = db()
-    rows = con.execute("SELECT * FROM projects ORDER BY created_at DESC").fetchall()
-    con.close()
-    return {"items": [dict(r) for r in rows]}
+def list_projects(after: Optional[str] = None, limit: Optional[int] = None,
+                  fmt: Optional[str] = Query(None, alias="format"), accept: Optional[str] = Header(None)):
+    return _listing("projects", None, after, limit, fmt, accept)
 
 @app.post("/api/projects")
 def create_project(p: ProjectIn):
     pid = str(uuid.uuid4())
-    con = db()
-    con.execute("INSERT INTO projects(id,name,description,created_at) VALUES(?,?,?,?)", (pid, p.name, p.description or "", int(time.time())))
-    con.commit()
-    con.close()
+    with db() as con:
+        con.execute("INSERT INTO projects(id,name,description,created_at) VALUES(?,?,?,?)", (pid, p.name, p.description or "", int(time.time())))
     return {"id": pid}
 
-@app.get("/api/tasks")
-def list_tasks(project_id: Optional[str] = None):
-    con = db()
+def _stats_item(project_id: str, row, by_status: Dict[str, int]) -> dict:
+    return {
+        "project_id": project_id,
+        "tasks": {"total": row["task_count"] if row else 0, "by_status": by_status},
+        "files": {"count": row["file_count"] if row else 0, "bytes": row["file_bytes"] if row else 0},
+        "last_activity": row["last_activity"] if row else None,
+    }
+
+@app.get("/api/projects/stats")
+def projects_stats(ids: Optional[str] = None):
+    # ids: optional comma-separated project ids; default is every project with activity.
+    wanted = [i for i in (ids or "").split(",") if i]
+    with db() as con:
+        if wanted:
+            marks = ",".join("?" * len(wanted))
+            rows = con.execute(f"SELECT * FROM project_stats WHERE project_id IN ({marks})", wanted).fetchall()
+            counts = con.execute(f"SELECT project_id, status, n FROM project_task_counts WHERE n > 0 AND project_id IN ({marks})", wanted).fetchall()
+        else:
+            rows = con.execute("SELECT * FROM project_stats").fetchall()
+            counts = con.execute("SELECT project_id, status, n FROM project_task_counts WHERE n > 0").fetchall()
+    by_project: Dict[str, Dict[str, int]] = {}
+    for c in counts:
+        by_project.setdefault(c["project_id"], {})[c["status"]] = c["n"]
+    found = {r["project_id"]: r for r in rows}
+    keys = wanted or list(found)
+    return {"items": [_stats_item(pid, found.get(pid), by_project.get(pid, {})) for pid in keys]}
+
+@app.get("/api/projects/{project_id}/stats")
+def project_stats(project_id: str):
+    with db() as con:
+        row = con.execute("SELECT * FROM project_stats WHERE project_id=?", (project_id,)).fetchone()
+        counts = con.execute("SELECT status, n FROM project_task_counts WHERE project_id=? AND n > 0", (project_id,)).fetchall()
+    return _stats_item(project_id, row, {c["status"]: c["n"] for c in counts})
+
+def _fts_query(q: str) -> str:
+    # Treat user input as plain terms (AND-ed, last one as prefix) rather than FTS5 syntax.
+    terms = ['"' + t.replace('"', '""') + '"' for t in q.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+@app.get("/api/search")
+def search(q: str, project_id: Optional[str] = None, after: Optional[str] = None, limit: Optional[int] = None):
+    match = _fts_query(q)
+    if not match:
+        return {"items": [], "next_after": None}
+    limit = max(1, min(limit or PAGE_LIMIT_DEFAULT, PAGE_LIMIT_MAX))
+    # bm25() is lower-is-better; cursor is "<score>,<rowid>" of the last item of the previous page.
+    where, params = ["search_fts MATCH ?"], [match]
     if project_id:
-        rows = con.execute("SELECT * FROM tasks WHERE project_id=? ORDER BY created_at DESC", (project_id,)).fetchall()
-    else:
-        rows = con.execute("SELECT * FROM tasks ORDER BY created_at DESC").fetchall()
-    con.close()
-    return {"items": [dict(r) for r in rows]}
+        where.append("d.project_id=?")
+        params.append(project_id)
+    sql = f"""SELECT * FROM (
+        SELECT d.rowid AS rid, d.kind, d.ref_id, d.project_id, d.created_at, bm25(search_fts) AS score,
+               snippet(search_fts, 0, '<mark>', '</mark>', '…', 16) AS snippet
+        FROM search_fts JOIN search_docs d ON d.rowid=search_fts.rowid
+        WHERE {" AND ".join(where)})"""
+    if after:
+        score, _, rid = after.partition(",")
+        try:
+            params.extend([float(score), int(rid)])
+        except ValueError:
+            raise HTTPException(400, "Invalid cursor. Expected after=<score>,<rowid>.")
+        sql += " WHERE (score, rid) > (?, ?)"
+    sql += " ORDER BY score, rid LIMIT ?"
+    params.append(limit)
+    try:
+        with db() as con:
+            rows = con.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as e:
+        raise HTTPException(400, f"Invalid search query: {e}")
+    items = [{"kind": r["kind"], "id": r["ref_id"], "project_id": r["project_id"], "created_at": r["created_at"],
+              "score": r["score"], "snippet": r["snippet"]} for r in rows]
+    next_after = f"{rows[-1]['score']!r},{rows[-1]['rid']}" if len(rows) == limit else None
+    return {"items": items, "next_after": next_after}
+
+@app.get("/api/tasks")
+def list_tasks(project_id: Optional[str] = None, after: Optional[str] = None, limit: Optional[int] = None,
+               fmt: Optional[str] = Query(None, alias="format"), accept: Optional[str] = Header(None)):
+    return _listing("tasks", project_id, after, limit, fmt, accept)
 
 @app.post("/api/tasks")
 def create_task(t: TaskIn):
     tid = str(uuid.uuid4())
-    con = db()
-    con.execute("INSERT INTO tasks(id,project_id,title,status,due_date,created_at) VALUES(?,?,?,?,?,?)",
-                (tid, t.project_id, t.title, t.status, t.due_date, int(time.time())))
-    con.commit()
-    con.close()
+    with db() as con:
+        con.execute("INSERT INTO tasks(id,project_id,title,status,due_date,created_at) VALUES(?,?,?,?,?,?)",
+                    (tid, t.project_id, t.title, t.status, t.due_date, int(time.time())))
     return {"id": tid}
 
-@app.post("/api/files/upload")
-async def upload_file(project_id: str, file: UploadFile = File(...)):
+async def _bulk_payload(request: Request):
+    # Yields (index, raw item): NDJSON is parsed line by line as it arrives; otherwise a JSON
+    # array (or {"items": [...]}) body. Raw NDJSON lines are returned as bytes and decoded per item.
+    if "ndjson" in request.headers.get("content-type", ""):
+        index, buf = 0, b""
+        async for chunk in request.stream():
+            buf += chunk
+            *lines, buf = buf.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, line
+                    index += 1
+        if buf.strip():
+            yield index, buf
+        return
+    try:
+        body = json.loads(await request.body() or b"[]")
+    except ValueError as e:
+        raise HTTPException(400, f"Invalid JSON body: {e}")
+    if isinstance(body, dict):
+        body = body.get("items")
+    if not isinstance(body, list):
+        raise HTTPException(400, "Expected a JSON array, {\"items\": [...]} or an NDJSON body.")
+    for index, item in enumerate(body):
+        yield index, item
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(x) for x in err['loc']) or 'item'}: {err['msg']}" for err in e.errors())
+
+def _executemany(sql: str, rows: list):
+    with db() as con:
+        con.executemany(sql, rows)
+
+async def _bulk_insert(request: Request, model, sql: str, to_row) -> dict:
+    # Validates each item with the single-create model and inserts in chunks of
+    # BULK_CHUNK_ROWS rows, one transaction per chunk. Row tuples start with the new id.
+    results: List[Dict[str, Any]] = []
+    batch: List[tuple] = []
+
+    async def flush():
+        try:
+            await run_in_threadpool(_executemany, sql, [row for _, row in batch])
+            results.extend({"index": i, "id": row[0]} for i, row in batch)
+        except sqlite3.Error as e:
+            results.extend({"index": i, "error": f"database error: {e}"} for i, _ in batch)
+        batch.clear()
+
+    async for index, raw in _bulk_payload(request):
+        try:
+            item = json.loads(raw) if isinstance(raw, bytes) else raw
+            obj = model.model_validate(item)
+        except ValueError as e:
+            msg = _validation_message(e) if isinstance(e, ValidationError) else f"invalid JSON: {e}"
+            results.append({"index": index, "error": msg})
+            continue
+        batch.append((index, to_row(obj)))
+        if len(batch) >= BULK_CHUNK_ROWS:
+            await flush()
+    if batch:
+        await flush()
+
+    results.sort(key=lambda r: r["index"])
+    created = sum(1 for r in results if "id" in r)
+    return {"items": results, "created": created, "failed": len(results) - created}
+
+@app.post("/api/projects:bulk")
+async def create_projects_bulk(request: Request):
+    now = int(time.time())
+    return await _bulk_insert(request, ProjectIn,
+                              "INSERT INTO projects(id,name,description,created_at) VALUES(?,?,?,?)",
+                              lambda p: (str(uuid.uuid4()), p.name, p.description or "", now))
+
+@app.post("/api/tasks:bulk")
+async def create_tasks_bulk(request: Request):
+    now = int(time.time())
+    return await _bulk_insert(request, TaskIn,
+                              "INSERT INTO tasks(id,project_id,title,status,due_date,created_at) VALUES(?,?,?,?,?,?)",
+                              lambda t: (str(uuid.uuid4()), t.project_id, t.title, t.status, t.due_date, now))
+
+def _blob_path(sha: str) -> str:
+    return os.path.join(BLOB_DIR, sha[:2], sha)
+
+def _commit_blob(tmp_path: str, sha: str) -> tuple:
+    # Atomically move the temp file into the content-addressed store; returns (path, deduplicated).
+    target = _blob_path(sha)
+    if os.path.exists(target):
+        os.remove(tmp_path)
+        return target, True
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(tmp_path, target)
+    return target, False
+
+class _MultipartUpload:
+    # Feeds request.stream() through python-multipart and writes the "file" part's bytes to
+    # `out` as they arrive, hashing on the way: the body is never spooled by Starlette first,
+    # and UPLOAD_MAX_BYTES is enforced while receiving. Other form fields are ignored.
+    def __init__(self, boundary: bytes, out):
+        self.out = out
+        self.sha = hashlib.sha256()
+        self.size = 0
+        self.filename: Optional[str] = None
+        self.content_type = ""
+        self.found = False
+        self._pending = bytearray()
+        self._in_file = False
+        self._field = b""
+        self._value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self.parser = multipart.MultipartParser(boundary, {
+            "on_part_begin": self._part_begin,
+            "on_header_field": lambda data, start, end: self._add(start, end, data, "_field"),
+            "on_header_value": lambda data, start, end: self._add(start, end, data, "_value"),
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        })
+
+    def _add(self, start: int, end: int, data: bytes, attr: str) -> None:
+        setattr(self, attr, getattr(self, attr) + data[start:end])
+
+    def _part_begin(self) -> None:
+        self._headers = {}
+
+    def _header_end(self) -> None:
+        self._headers[self._field.lower()] = self._value
+        self._field, self._value = b"", b""
+
+    def _headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._in_file = not self.found and options.get(b"name") == b"file" and b"filename" in options
+        if self._in_file:
+            self.found = True
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+            self.content_type = self._headers.get(b"content-type", b"").decode("latin-1")
+
+    def _part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self._in_file:
+            return
+        chunk = data[start:end]
+        self.size += len(chunk)
+        if self.size > UPLOAD_MAX_BYTES:
+            raise HTTPException(413, f"File exceeds ATLAS_UPLOAD_MAX_BYTES ({UPLOAD_MAX_BYTES} bytes).")
+        self.sha.update(chunk)
+        self._pending += chunk
+
+    def _part_end(self) -> None:
+        self._in_file = False
+
+    async def feed(self, chunk: bytes) -> None:
+        self.parser.write(chunk)
+        if len(self._pending) >= UPLOAD_CHUNK_BYTES:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if self._pending:
+            data, self._pending = bytes(self._pending), bytearray()
+            await run_in_threadpool(self.out.write, data)
+
+_UPLOAD_OPENAPI = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}}}}}}}
+
+@app.post("/api/files/upload", openapi_extra=_UPLOAD_OPENAPI)
+async def upload_file(project_id: str, request: Request):
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(400, "Expected a multipart/form-data body with a 'file' field.")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD:
+        raise HTTPException(413, f"File exceeds ATLAS_UPLOAD_MAX_BYTES ({UPLOAD_MAX_BYTES} bytes).")
     fid = str(uuid.uuid4())
-    target = os.path.join(UPLOAD_DIR, f"{fid}_{file.filename}")
-    data = await file.read()
-    with open(target, "wb") as f:
-        f.write(data)
-    con = db()
-    con.execute("INSERT INTO files(id,project_id,filename,path,mime,size,created_at) VALUES(?,?,?,?,?,?,?)",
-                (fid, project_id, file.filename, target, file.content_type or "", len(data), int(time.time())))
-    con.commit()
-    con.close()
-    return {"id": fid, "filename": file.filename}
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_TMP_DIR, prefix=f"{fid}_")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            upload = _MultipartUpload(options[b"boundary"], out)
+            async for chunk in request.stream():
+                await upload.feed(chunk)
+            upload.parser.finalize()
+            await upload.flush()
+        if not upload.found:
+            raise HTTPException(422, "Multipart field 'file' is required.")
+        sha = upload.sha.hexdigest()
+        target, deduplicated = await run_in_threadpool(_commit_blob, tmp_path, sha)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    size, filename = upload.size, upload.filename
+    with db() as con:
+        con.execute("INSERT INTO files(id,project_id,filename,path,mime,size,created_at,sha256) VALUES(?,?,?,?,?,?,?,?)",
+                    (fid, project_id, filename, target, upload.content_type, size, int(time.time()), sha))
+    return {"id": fid, "filename": filename, "size": size, "sha256": sha, "deduplicated": deduplicated}
 
 @app.get("/api/files")
-def list_files(project_id: Optional[str] = None):
-    con = db()
-    if project_id:
-        rows = con.execute("SELECT * FROM files WHERE project_id=? ORDER BY created_at DESC", (project_id,)).fetchall()
-    else:
-        rows = con.execute("SELECT * FROM files ORDER BY created_at DESC").fetchall()
-    con.close()
-    items = [dict(r) for r in rows]
-    # Do not expose absolute path by default
-    for it in items:
-        it["path"] = None
-    return {"items": items}
+def list_files(project_id: Optional[str] = None, after: Optional[str] = None, limit: Optional[int] = None,
+               fmt: Optional[str] = Query(None, alias="format"), accept: Optional[str] = Header(None)):
+    return _listing("files", project_id, after, limit, fmt, accept, row=_file_row)
+
+class BlobResponse(Response):
+    # Serves bytes [start, start+length) of a file. When the ASGI server advertises the
+    # http.response.zerocopysend extension the fd is handed over (sendfile); otherwise it is
+    # streamed in chunks from a worker thread, never loading the whole file.
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: str, start: int, length: int, status_code: int = 200,
+                 headers: Optional[Dict[str, str]] = None, media_type: Optional[str] = None):
+        self.path = path
+        self.start = start
+        self.length = length
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({"type": "http.response.zerocopysend", "file": f, "offset": self.start,
+                            "count": self.length, "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as f:
+            await f.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+def _parse_range(header: str, size: int):
+    # Single "bytes=a-b" / "bytes=a-" / "bytes=-n" range -> (start, end) inclusive.
+    # None means serve the full body (absent, malformed or multi-range); raises 416 if unsatisfiable.
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start, end = max(0, size - int(last)), size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end or (not first and not last):
+        raise HTTPException(416, "Requested range not satisfiable.", headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or etag.removeprefix("W/") in [t.removeprefix("W/") for t in tags]
+
+def _content_disposition(filename: str, disposition: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+@app.api_route("/api/files/{file_id}/content", methods=["GET", "HEAD"])
+def download_file(file_id: str, disposition: str = "attachment", range_: Optional[str] = Header(None, alias="range"),
+                  if_none_match: Optional[str] = Header(None), if_range: Optional[str] = Header(None)):
+    with db() as con:
+        row = con.execute("SELECT filename, path, mime, sha256 FROM files WHERE id=?", (file_id,)).fetchone()
+    if not row:
+        raise HTTPException(404, "file not found")
+    try:
+        st = os.stat(row["path"])
+    except (OSError, TypeError):
+        raise HTTPException(410, "file content missing")
+    size = st.st_size
+    # Strong ETag from the content hash; legacy rows without one fall back to a weak stat-based tag.
+    etag = f'"{row["sha256"]}"' if row["sha256"] else f'W/"{st.st_mtime_ns:x}-{size:x}"'
+    filename = row["filename"] or file_id
+    headers = {
+        "etag": etag,
+        "accept-ranges": "bytes",
+        "last-modified": formatdate(st.st_mtime, usegmt=True),
+        "content-disposition": _content_disposition(filename, "inline" if disposition == "inline" else "attachment"),
+    }
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={k: headers[k] for k in ("etag", "last-modified")})
+    media_type = row["mime"] or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    byte_range = None
+    if range_ and (not if_range or if_range.strip() == etag and not etag.startswith("W/")):
+        byte_range = _parse_range(range_, size)
+    if byte_range is None:
+        return BlobResponse(row["path"], 0, size, headers=headers, media_type=media_type)
+    start, end = byte_range
+    headers["content-range"] = f"bytes {start}-{end}/{size}"
+    return BlobResponse(row["path"], start, end - start + 1, status_code=206, headers=headers, media_type=media_type)
+
+class ChatLogWriter:
+    # Write-behind persistence for chat_logs: handlers enqueue rows and return; one background
+    # thread drains the queue and group-commits up to batch_max rows every flush_ms.
+    # Messages the client re-sends are skipped via an in-memory (project, hash) LRU and,
+    # across restarts, by the unique (project_id, content_hash) index.
+    _STOP = object()
+
+    def __init__(self, flush_ms: int = 50, batch_max: int = 500, queue_max: int = 10000, seen_max: int = 100_000):
+        self.flush_s = flush_ms / 1000
+        self.batch_max = batch_max
+        self.seen_max = seen_max
+        self._q: "queue.Queue" = queue.Queue(maxsize=queue_max)
+        self._seen: "OrderedDict[tuple, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def content_hash(role: str, content: str) -> str:
+        return hashlib.sha256(f"{role}\0{content}".encode("utf-8")).hexdigest()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="chat-log-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, project_id: str, messages: List[Dict[str, Any]], now: int) -> int:
+        self.start()
+        queued = 0
+        for m in messages:
+            role = str(m.get("role","user"))
+            content = str(m.get("content",""))
+            key = (project_id, self.content_hash(role, content))
+            with self._lock:
+                if key in self._seen:
+                    self._seen.move_to_end(key)
+                    continue
+                self._seen[key] = None
+                if len(self._seen) > self.seen_max:
+                    self._seen.popitem(last=False)
+            self._q.put((str(uuid.uuid4()), project_id, role, content, now, key[1]))
+            queued += 1
+        return queued
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            item = self._q.get()
+            if item is self._STOP:
+                self._q.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_s
+            while len(batch) < self.batch_max:
+                try:
+                    nxt = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if nxt is self._STOP:
+                    self._q.task_done()
+                    stop = True
+                    break
+                batch.append(nxt)
+            self._write(batch)
+            for _ in batch:
+                self._q.task_done()
+
+    def _write(self, batch: list) -> None:
+        try:
+            with db() as con:
+                con.executemany("INSERT OR IGNORE INTO chat_logs(id,project_id,role,content,created_at,content_hash) VALUES(?,?,?,?,?,?)", batch)
+        except sqlite3.Error:
+            log.exception("chat_logs write-behind batch of %d rows failed", len(batch))
+            with self._lock:
+                for row in batch:
+                    self._seen.pop((row[1], row[5]), None)
+
+    def flush(self) -> None:
+        # Blocks until everything queued so far is committed.
+        if self._thread is not None and self._thread.is_alive():
+            self._q.join()
+
+    def stop(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._q.put(self._STOP)
+            thread.join()
+
+chat_writer = ChatLogWriter(CHAT_FLUSH_MS, CHAT_BATCH_MAX, CHAT_QUEUE_MAX)
 
 @app.post("/api/chat")
 def chat(c: ChatIn):
-    # Factory-safe stub: persists messages, returns echo and hook point for LLM
-    now = int(time.time())
-    con = db()
-    for m in c.messages[-10:]:
-        role = str(m.get("role","user"))
-        content = str(m.get("content",""))
-        cid = str(uuid.uuid4())
-        con.execute("INSERT INTO chat_logs(id,project_id,role,content,created_at) VALUES(?,?,?,?,?)",
-                    (cid, c.project_id, role, content, now))
-    con.commit()
-    con.close()
+    # Factory-safe stub: queues messages for write-behind persistence, returns echo and hook point for LLM
+    chat_writer.submit(c.project_id, c.messages[-10:], int(time.time()))
     last = c.messages[-1]["content"] if c.messages else ""
     return {"reply": f"[Atlas PMX] Received: {last}", "mode": "stub", "next": "wire LLM provider via settings"}
 
+@app.on_event("startup")
+def _start_chat_writer():
+    chat_writer.start()
+
+@app.on_event("shutdown")
+def _close_pool():
+    chat_writer.stop()
+    pool.close_all()
+
 @app.get("/api/admin/rbac/roles")
 def roles():
     return {"roles": ["viewer","engineer","pm","admin","owner"]}
@@ -157,3 +868,17 @@ def roles():
 SPA_DIR = os.getenv("ATLAS_SPA_DIR", "")
 if SPA_DIR and os.path.isdir(SPA_DIR):
     app.mount("/", StaticFiles(directory=SPA_DIR, html=True), name="spa")
+
+if __name__ == "__main__":
+    # Maintenance: python main.py rebuild-search | rebuild-stats
+    import argparse
+    ap = argparse.ArgumentParser(description=APP_NAME)
+    ap.add_argument("command", choices=["rebuild-search", "rebuild-stats"])
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    with db() as con:
+        if args.command == "rebuild-search":
+            print(f"indexed {rebuild_search_index(con)} rows", end=" ")
+        else:
+            rebuild_project_stats(con)
+    print(f"({args.command} done in {time.perf_counter() - t0:.2f}s)")
@@ -7,4 +7,6 @@ npm run build
 if (Test-Path "$ROOT\backend\app\static") { Remove-Item -Recurse -Force "$ROOT\backend\app\static" }
 New-Item -ItemType Directory -Force -Path "$ROOT\backend\app\static" | Out-Null
 Copy-Item -Recurse -Force "$ROOT\frontend\dist\*" "$ROOT\backend\app\static\"
+Set-Location "$ROOT"
+python -m backend.app.core.static_assets "$ROOT\backend\app\static"
 Write-Host "OK: frontend dist copied to backend\app\static"
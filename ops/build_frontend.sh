@@ -7,4 +7,5 @@ npm run build
 rm -rf "$ROOT/backend/app/static"
 mkdir -p "$ROOT/backend/app/static"
 cp -R "$ROOT/frontend/dist/"* "$ROOT/backend/app/static/"
+cd "$ROOT" && "${PYTHON:-python}" -m backend.app.core.static_assets "$ROOT/backend/app/static"
 echo "OK: frontend dist copied to backend/app/static"
@@ -1,5 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse
 from .engine import export_from_payload, list_exports, download_export, list_presets, spec_schema
+from . import jobs
 
 router = APIRouter(prefix="/api/factory", tags=["factory"])
 
@@ -12,10 +14,29 @@ def presets():
     return {"items": list_presets()}
 
 @router.post("/export")
-def export(payload: dict):
+def export(payload: dict, async_: bool = Query(False, alias="async")):
     # payload can be: {"preset_id": "..."} OR full {"spec": {...}}
+    # ?async=1 queues the build and returns a job id to poll at /api/factory/jobs/{id}
+    if async_:
+        job = jobs.submit(payload)
+        return JSONResponse({**job, "status_url": f"/api/factory/jobs/{job['job_id']}"}, status_code=202)
     return export_from_payload(payload)
 
+@router.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "job not found")
+    return job
+
+@router.on_event("startup")
+def _resume_jobs():
+    jobs.resume()
+
+@router.on_event("shutdown")
+def _stop_jobs():
+    jobs.shutdown()
+
 @router.get("/exports")
 def exports():
     return {"items": list_exports()}